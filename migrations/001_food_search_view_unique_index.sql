@@ -0,0 +1,4 @@
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index (without a WHERE
+-- clause) on the view. Food_Search_View has one row per food variant.
+CREATE UNIQUE INDEX IF NOT EXISTS food_search_view_variant_id_idx
+    ON Food_Search_View (variant_id);
@@ -0,0 +1,22 @@
+-- Indexes backing the lookups in foodie/logic/food_db.py.
+
+-- Case-insensitive name check in /foods/add (WHERE NOT EXISTS ... LOWER(name)).
+-- Unique, which also enforces the "food already exists" rule under concurrent adds.
+--
+-- The index cannot be built while Foods holds names that differ only in case, so
+-- stop with a readable error first. Those foods have to be merged by hand: keep one
+-- food_id per name, point its duplicates' Food_Variants (and anything else that
+-- references them) at it, delete the duplicates, then rerun this migration.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM Foods GROUP BY LOWER(name) HAVING COUNT(*) > 1) THEN
+        RAISE EXCEPTION 'Foods has names that differ only in case; merge them before creating idx_foods_lower_name'
+            USING HINT = 'SELECT LOWER(name), array_agg(food_id ORDER BY food_id) FROM Foods GROUP BY LOWER(name) HAVING COUNT(*) > 1;';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_foods_lower_name ON Foods (LOWER(name));
+
+-- Foreign keys used by the /foods/{food_id}/variants join.
+CREATE INDEX IF NOT EXISTS idx_fv_food_id ON Food_Variants (food_id);
+CREATE INDEX IF NOT EXISTS idx_fn_variant_id ON Food_Nutrients (variant_id);
@@ -1,8 +1,10 @@
+import argparse
 import subprocess
 import sys
 import os
 import time
 import socket
+import threading
 
 def find_free_port(preferred: int) -> int:
     """Return preferred port if free, otherwise find a random free one."""
@@ -14,7 +16,56 @@ def find_free_port(preferred: int) -> int:
         s.bind(("", 0))
         return s.getsockname()[1]
 
+def wait_for_any_child(processes) -> None:
+    """Block until any of the child processes exits.
+
+    On POSIX the parent sleeps in waitpid() instead of polling, and the reaped
+    child's exit code is recorded on its Popen so poll() keeps reporting it.
+    Windows has no waitpid(-1), so each child gets a waiter thread; Windows only
+    delivers Ctrl+C to timed waits, hence the timeout there.
+    """
+    if os.name != "nt":
+        pid, status = os.waitpid(-1, 0)
+        for p in processes:
+            if p.pid == pid:
+                p.returncode = os.waitstatus_to_exitcode(status)
+        return
+    exited = threading.Event()
+    for p in processes:
+        threading.Thread(target=lambda p=p: (p.wait(), exited.set()), daemon=True).start()
+    while not exited.wait(timeout=1):
+        pass
+
+def build_api_command(mode: str, api_port: str, reload_dir: str = None) -> list:
+    """Return the command that serves foodie.api:app for the given run mode."""
+    if mode == "prod":
+        # gunicorn supervises a Uvicorn worker and restarts it if it dies.
+        # The adaptive service keeps users in process memory, so this stays a single,
+        # never-recycled worker until that state moves to a shared store: with more
+        # workers a user created on one would be missing on the others.
+        return [sys.executable, "-m", "gunicorn",
+                "-k", "uvicorn_worker.UvicornWorker",
+                "-w", "1",
+                "-b", f"0.0.0.0:{api_port}",
+                "foodie.api:app"]
+    command = [sys.executable, "-m", "uvicorn", "foodie.api:app",
+               "--host", "0.0.0.0", "--port", api_port]
+    if reload_dir:
+        # With watchfiles installed uvicorn waits on OS file events rather than
+        # polling; watching only the package keeps .venv and caches out of it.
+        command += ["--reload", "--reload-dir", reload_dir, "--reload-delay", "0.25"]
+    return command
+
 def main():
+    parser = argparse.ArgumentParser(description="Run the Foodie API and Streamlit UI.")
+    parser.add_argument("--mode", choices=["dev", "prod"], default="dev",
+                        help="dev: single uvicorn process; prod: gunicorn-supervised Uvicorn worker")
+    parser.add_argument("--reload", action="store_true",
+                        help="dev only: restart the API when files under src/foodie change")
+    args = parser.parse_args()
+    if args.reload and args.mode != "dev":
+        parser.error("--reload is only supported in dev mode")
+
     # Get the project root directory (where this script is)
     project_root = os.path.dirname(os.path.abspath(__file__))
     src_path = os.path.join(project_root, "src")
@@ -41,10 +92,10 @@ def main():
 
     try:
         # 1. Start FastAPI (Uvicorn) on a fixed internal port
-        print(f"Starting FastAPI server on port {api_port}...")
+        print(f"Starting FastAPI server on port {api_port} ({args.mode} mode)...")
         api_process = subprocess.Popen(
-            [sys.executable, "-m", "uvicorn", "foodie.api:app",
-             "--host", "0.0.0.0", "--port", api_port],
+            build_api_command(args.mode, api_port,
+                              os.path.join(src_path, "foodie") if args.reload else None),
             cwd=project_root,
             env=env
         )
@@ -67,15 +118,12 @@ def main():
 
         print("Services are running. Press Ctrl+C to stop.")
         
-        # Monitor processes
-        while True:
-            time.sleep(1)
-            if api_process.poll() is not None:
-                print("FastAPI process exited unexpectedly.")
-                break
-            if streamlit_process.poll() is not None:
-                print("Streamlit process exited unexpectedly.")
-                break
+        # Block until a child exits instead of polling every second.
+        wait_for_any_child(processes)
+        if api_process.poll() is not None:
+            print("FastAPI process exited unexpectedly.")
+        if streamlit_process.poll() is not None:
+            print("Streamlit process exited unexpectedly.")
 
     except KeyboardInterrupt:
         print("\nStopping services...")
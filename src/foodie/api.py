@@ -9,18 +9,18 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Include routers from the sub-applications
-# Note: We are including the routers from the existing FastAPI apps.
-# This merges their endpoints into the main app.
-app.include_router(adaptive_app.router)
-app.include_router(food_db_app.router)
+# Mount the sub-applications under their own prefixes.
+# Requests are dispatched on the prefix first, so each one only scans the
+# sub-app's own routes, and each sub-app keeps its own exception handlers.
+app.mount("/adaptive", adaptive_app)
+app.mount("/food", food_db_app)
 
 @app.get("/")
 def root():
     return {
         "message": "Welcome to the Foodie Unified API",
         "endpoints": {
-            "adaptive_nutrition": "/v1/users",
-            "food_database": "/foods/query"
+            "adaptive_nutrition": "/adaptive/v1/users",
+            "food_database": "/food/foods/query"
         }
     }
@@ -1,15 +1,75 @@
-from datetime import date, timedelta
-from typing import Dict, List, Optional
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
 from foodie.logic.models import User, LogEntry
 from .openrouter_client import OpenRouterClient
 import json
+import re
 
 class NutritionAssistant:
-    """Personalized nutrition assistant with access to user data"""
+    """Personalized nutrition assistant with access to user data.
+
+    Holds no per-conversation state, so one instance is shared across sessions;
+    conversation history is passed in explicitly on every call.
+    """
+    
+    # Messages that mention food get recent food context. Only the start of the word
+    # is anchored so "eating" and "carbs" match but "escalate" does not.
+    _FOOD_RE = re.compile(r"\b(?:food|eat|meal|calorie|macro|protein|carb|fat|kcal|snack)", re.IGNORECASE)
+    
+    # Topic buttons, built once; suggest_topics only decides which optional ones show
+    _PROGRESS_SUGGESTION = "📈 How am I progressing toward my goal?"
+    _TROUBLESHOOT_SUGGESTION = "🔧 Why isn't my goal adapting yet?"
+    _BASE_SUGGESTIONS = (
+        "🍽️ Suggest meals for my macro targets",
+        "💪 I need some motivation",
+        "🤔 Explain how the adaptive system works",
+    )
     
     def __init__(self):
         self.client = OpenRouterClient()
-        self.conversation_context = []
+        # Rendered prompts per user, reused until the user's data fingerprint changes
+        self._prompt_cache: Dict[str, Tuple[tuple, str]] = {}
+        self._food_summary_cache: Dict[str, Tuple[tuple, str]] = {}
+    
+    def _prompt_fingerprint(self, user: User) -> tuple:
+        """Cheap key covering every user field the system prompt depends on"""
+        return (
+            # Changes on any log upsert, including edits to earlier days
+            user._logs_key(),
+            user.name,
+            tuple(user.profile.model_dump().values()),
+            tuple(user.macro_targets.model_dump().values()),
+            tuple(user.data_quality.model_dump().values()),
+            user.adapted_calorie_goal,
+            user.kf_tdee_estimate,
+            len(user.adaptation_history),
+        )
+    
+    def _get_system_prompt(self, user: User) -> str:
+        """Return the cached system prompt, rebuilding it only when user data changed"""
+        fingerprint = self._prompt_fingerprint(user)
+        cached = self._prompt_cache.get(user.user_id)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        
+        system_prompt = self._build_system_prompt(user)
+        self._prompt_cache[user.user_id] = (fingerprint, system_prompt)
+        return system_prompt
+    
+    def _get_food_summary(self, user: User) -> str:
+        """Return the cached recent food summary, rebuilding it when food entries or the day change"""
+        fingerprint = (
+            len(user.food_items),
+            next(reversed(user.food_items), None),
+            date.today(),
+        )
+        cached = self._food_summary_cache.get(user.user_id)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        
+        food_summary = self._get_recent_food_summary(user)
+        self._food_summary_cache[user.user_id] = (fingerprint, food_summary)
+        return food_summary
         
     def _build_system_prompt(self, user: User) -> str:
         """Build a personalized system prompt based on user data"""
@@ -20,11 +80,12 @@ class NutritionAssistant:
         goal_rate = user.profile.goal_kg_per_week
         
         # Recent progress
-        recent_logs = user.get_recent_logs(7) if user.logs else []
+        weights = user.log_arrays().weights
+        recent_count = min(7, len(weights))
         progress_summary = ""
-        if len(recent_logs) >= 2:
-            weight_change = recent_logs[-1].weight_kg - recent_logs[0].weight_kg
-            progress_summary = f"In the last {len(recent_logs)} days, their weight changed by {weight_change:+.1f} kg."
+        if recent_count >= 2:
+            weight_change = weights[-1] - weights[-recent_count]
+            progress_summary = f"In the last {recent_count} days, their weight changed by {weight_change:+.1f} kg."
         
         # Adaptation info
         recent_adaptations = user.adaptation_history[-3:] if user.adaptation_history else []
@@ -93,35 +154,36 @@ Remember: You're their personal nutrition companion who knows their journey inti
     
     def _get_recent_food_summary(self, user: User) -> str:
         """Get a summary of recent food logging for context"""
-        today = date.today()
-        recent_items = [
-            item for item in user.food_items 
-            if item.log_date >= today - timedelta(days=3)
-        ]
+        today = date.today().toordinal()
         
-        if not recent_items:
+        # Single pass: bucket items by how many days ago they were logged (int ordinals, no timedeltas)
+        item_counts = [0, 0, 0]
+        calorie_totals = [0, 0, 0]
+        for item in user.food_items.values():
+            day_offset = today - item.log_date.toordinal()
+            if 0 <= day_offset < 3:
+                item_counts[day_offset] += 1
+                calorie_totals[day_offset] += item.calories
+        
+        if not any(item_counts):
             return "No recent food entries found."
         
         summary = "Recent food entries:\n"
-        for day_offset in range(3):
-            check_date = today - timedelta(days=day_offset)
-            day_items = [item for item in recent_items if item.log_date == check_date]
-            
-            if day_items:
+        for day_offset, (count, total_cals) in enumerate(zip(item_counts, calorie_totals)):
+            if count:
                 day_name = "Today" if day_offset == 0 else f"{day_offset} day(s) ago"
-                total_cals = sum(item.calories for item in day_items)
-                summary += f"- {day_name}: {len(day_items)} items, {total_cals} kcal total\n"
+                summary += f"- {day_name}: {count} items, {total_cals} kcal total\n"
         
         return summary
     
-    def chat(self, user_message: str, user: User, conversation_history: List[Dict] = None) -> str:
-        """Generate a response to user message with full context"""
+    def _build_messages(self, user_message: str, user: User, conversation_history: List[Dict] = None) -> List[Dict]:
+        """Assemble the system prompt, history, food context and user message"""
         
         # Build the conversation with system prompt
         messages = []
         
         # Add system prompt with current user data
-        system_prompt = self._build_system_prompt(user)
+        system_prompt = self._get_system_prompt(user)
         messages.append({"role": "system", "content": system_prompt})
         
         # Add conversation history if provided (clean any extra fields)
@@ -136,13 +198,19 @@ Remember: You're their personal nutrition companion who knows their journey inti
                     messages.append(clean_msg)
         
         # Add current food context if relevant to the conversation
-        if any(keyword in user_message.lower() for keyword in ['food', 'eat', 'meal', 'calorie', 'macro', 'protein', 'carb', 'fat']):
-            food_summary = self._get_recent_food_summary(user)
+        if self._FOOD_RE.search(user_message):
+            food_summary = self._get_food_summary(user)
             context_message = f"Recent food context for reference: {food_summary}"
             messages.append({"role": "system", "content": context_message})
         
         # Add the user's current message
         messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def chat(self, user_message: str, user: User, conversation_history: List[Dict] = None) -> str:
+        """Generate a response to user message with full context"""
+        
+        messages = self._build_messages(user_message, user, conversation_history)
         
         # Get AI response
         try:
@@ -163,6 +231,16 @@ Remember: You're their personal nutrition companion who knows their journey inti
         except Exception as e:
             return f"An unexpected error occurred: {str(e)}. Please try again later."
     
+    def chat_stream(self, user_message: str, user: User, conversation_history: List[Dict] = None) -> Iterator[str]:
+        """Stream a response to user message token-by-token with full context"""
+        
+        messages = self._build_messages(user_message, user, conversation_history)
+        return self.client.stream_chat_completion(
+            messages=messages,
+            max_tokens=800,
+            temperature=0.7
+        )
+    
     def get_greeting(self, user: User) -> str:
         """Generate a personalized greeting based on user's current situation"""
         
@@ -188,24 +266,14 @@ Remember: You're their personal nutrition companion who knows their journey inti
     def suggest_topics(self, user: User) -> List[str]:
         """Suggest conversation topics based on user's current situation"""
         
-        suggestions = []
-        
-        # Recent progress
-        recent_logs = user.get_recent_logs(7)
-        if len(recent_logs) >= 3:
-            suggestions.append("📈 How am I progressing toward my goal?")
-        
-        # Food suggestions
-        suggestions.append("🍽️ Suggest meals for my macro targets")
+        suggestions = list(self._BASE_SUGGESTIONS)
         
-        # Troubleshooting
+        # Troubleshooting, right after the meal suggestion
         if user.adaptation_confidence < 0.5:
-            suggestions.append("🔧 Why isn't my goal adapting yet?")
-        
-        # Motivation
-        suggestions.append("💪 I need some motivation")
+            suggestions.insert(1, self._TROUBLESHOOT_SUGGESTION)
         
-        # Education
-        suggestions.append("🤔 Explain how the adaptive system works")
+        # Recent progress; the last 7 logs hold 3+ entries exactly when the user has 3+ logs
+        if len(user.logs) >= 3:
+            suggestions.insert(0, self._PROGRESS_SUGGESTION)
         
         return suggestions[:4]  # Limit to 4 suggestions
@@ -4,12 +4,17 @@ from datetime import datetime
 from foodie.logic.models import User
 from .assistant import NutritionAssistant
 
+@st.cache_resource
+def get_assistant() -> NutritionAssistant:
+    """Process-wide assistant shared by all sessions (one pooled HTTP client)"""
+    return NutritionAssistant()
+
 def initialize_chat_state():
     """Initialize chat-related session state variables"""
     if 'chat_messages' not in st.session_state:
         st.session_state.chat_messages = []
     if 'chat_assistant' not in st.session_state:
-        st.session_state.chat_assistant = NutritionAssistant()
+        st.session_state.chat_assistant = get_assistant()
     if 'chat_initialized' not in st.session_state:
         st.session_state.chat_initialized = False
 
@@ -44,120 +49,135 @@ def render_chat_assistant(user: User) -> None:
                     st.error(f"❌ Assistant setup failed: {str(e)}")
                     return
     
-    # Chat interface container
+    # Chat interface container; a fragment so chat turns rerun only the chat
     with st.sidebar:
-        # Chat history container with fixed height
-        chat_container = st.container(height=400)
+        _chat_fragment(user)
+
+@st.fragment
+def _chat_fragment(user: User) -> None:
+    """Chat history, suggestions and input, rerun on their own without the rest of the page"""
+    
+    # Chat history container with fixed height
+    chat_container = st.container(height=400)
+    
+    with chat_container:
+        # Display chat messages
+        for message in st.session_state.chat_messages:
+            if message["role"] == "user":
+                with st.chat_message("user"):
+                    st.write(message["content"])
+            else:
+                with st.chat_message("assistant"):
+                    st.write(message["content"])
+    
+    # Quick suggestion buttons (only show if no conversation yet or last was assistant)
+    if (len(st.session_state.chat_messages) <= 1 or 
+        (st.session_state.chat_messages and st.session_state.chat_messages[-1]["role"] == "assistant")):
         
-        with chat_container:
-            # Display chat messages
-            for message in st.session_state.chat_messages:
-                if message["role"] == "user":
-                    with st.chat_message("user"):
-                        st.write(message["content"])
-                else:
-                    with st.chat_message("assistant"):
-                        st.write(message["content"])
+        st.markdown("**💡 Quick topics:**")
+        suggestions = st.session_state.chat_assistant.suggest_topics(user)
         
-        # Quick suggestion buttons (only show if no conversation yet or last was assistant)
-        if (len(st.session_state.chat_messages) <= 1 or 
-            (st.session_state.chat_messages and st.session_state.chat_messages[-1]["role"] == "assistant")):
-            
-            st.markdown("**💡 Quick topics:**")
-            suggestions = st.session_state.chat_assistant.suggest_topics(user)
+        # Create columns for suggestion buttons
+        cols = st.columns(2)
+        for i, suggestion in enumerate(suggestions):
+            col = cols[i % 2]
+            suggestion_text = suggestion.split(' ', 1)[1] if ' ' in suggestion else suggestion
             
-            # Create columns for suggestion buttons
-            cols = st.columns(2)
-            for i, suggestion in enumerate(suggestions):
-                col = cols[i % 2]
-                suggestion_text = suggestion.split(' ', 1)[1] if ' ' in suggestion else suggestion
+            if col.button(
+                suggestion_text, 
+                key=f"suggestion_{i}",
+                help=suggestion,
+                use_container_width=True
+            ):
+                # Add user message
+                st.session_state.chat_messages.append({
+                    "role": "user",
+                    "content": suggestion_text,
+                    "timestamp": datetime.now()
+                })
                 
-                if col.button(
-                    suggestion_text, 
-                    key=f"suggestion_{i}",
-                    help=suggestion,
-                    use_container_width=True
-                ):
-                    # Add user message
-                    st.session_state.chat_messages.append({
-                        "role": "user",
-                        "content": suggestion_text,
-                        "timestamp": datetime.now()
-                    })
-                    
-                    # Get AI response
-                    with st.spinner("Thinking..."):
-                        # Prepare conversation history for context (exclude timestamps)
-                        conversation_history = []
-                        for msg in st.session_state.chat_messages[:-1]:  # Exclude the just-added message
-                            if msg["role"] in ["user", "assistant"]:
-                                conversation_history.append({
-                                    "role": msg["role"],
-                                    "content": msg["content"]
-                                })
-                        
-                        ai_response = st.session_state.chat_assistant.chat(
-                            suggestion_text, 
-                            user, 
-                            conversation_history
-                        )
-                    
-                    # Add AI response
-                    st.session_state.chat_messages.append({
-                        "role": "assistant",
-                        "content": ai_response,
-                        "timestamp": datetime.now()
-                    })
-                    st.rerun()
-        
-        # Chat input
-        user_input = st.chat_input(
-            placeholder="Ask me anything about your nutrition journey...",
-            key="chat_input"
-        )
-        
-        if user_input:
-            # Add user message to chat
-            st.session_state.chat_messages.append({
-                "role": "user",
-                "content": user_input,
-                "timestamp": datetime.now()
-            })
-            
-            # Get AI response
-            with st.spinner("Thinking..."):
-                # Prepare conversation history for context
+                # Prepare conversation history for context (exclude timestamps)
                 conversation_history = []
-                for msg in st.session_state.chat_messages[-6:-1]:  # Last 5 messages for context
+                for msg in st.session_state.chat_messages[:-1]:  # Exclude the just-added message
                     if msg["role"] in ["user", "assistant"]:
                         conversation_history.append({
                             "role": msg["role"],
                             "content": msg["content"]
                         })
                 
-                ai_response = st.session_state.chat_assistant.chat(
+                # Stream AI response into the chat as tokens arrive
+                with chat_container:
+                    with st.chat_message("user"):
+                        st.write(suggestion_text)
+                    ai_response = st.chat_message("assistant").write_stream(
+                        st.session_state.chat_assistant.chat_stream(
+                            suggestion_text, 
+                            user, 
+                            conversation_history
+                        )
+                    )
+                
+                # Add AI response
+                st.session_state.chat_messages.append({
+                    "role": "assistant",
+                    "content": ai_response,
+                    "timestamp": datetime.now()
+                })
+                st.rerun(scope="fragment")
+    
+    # Chat input
+    user_input = st.chat_input(
+        placeholder="Ask me anything about your nutrition journey...",
+        key="chat_input"
+    )
+    
+    if user_input:
+        # Add user message to chat
+        st.session_state.chat_messages.append({
+            "role": "user",
+            "content": user_input,
+            "timestamp": datetime.now()
+        })
+        
+        # Prepare conversation history for context
+        conversation_history = []
+        for msg in st.session_state.chat_messages[:-1]:  # Trimmed to the token budget by the client
+            if msg["role"] in ["user", "assistant"]:
+                conversation_history.append({
+                    "role": msg["role"],
+                    "content": msg["content"]
+                })
+        
+        # Stream AI response into the chat as tokens arrive
+        with chat_container:
+            with st.chat_message("user"):
+                st.write(user_input)
+            ai_response = st.chat_message("assistant").write_stream(
+                st.session_state.chat_assistant.chat_stream(
                     user_input, 
                     user, 
                     conversation_history
                 )
-            
-            # Add AI response to chat
-            st.session_state.chat_messages.append({
-                "role": "assistant",
-                "content": ai_response,
-                "timestamp": datetime.now()
-            })
-            
-            st.rerun()
+            )
         
-        # Clear chat button
-        if st.button("🗑️ Clear Chat", use_container_width=True):
-            st.session_state.chat_messages = []
-            st.session_state.chat_initialized = False
-            st.rerun()
+        # Add AI response to chat
+        st.session_state.chat_messages.append({
+            "role": "assistant",
+            "content": ai_response,
+            "timestamp": datetime.now()
+        })
         
-        # API status indicator
-        if st.session_state.chat_initialized:
-            st.markdown("<div style='text-align: center; font-size: 12px; color: green;'>🟢 AI Assistant Ready</div>", unsafe_allow_html=True)
-        else:
-            st.markdown("<div style='text-align: center; font-size: 12px; color: red;'>🔴 AI Assistant Disconnected</div>", unsafe_allow_html=True)
+        st.rerun(scope="fragment")
+    
+    # Clear chat button
+    if st.button("🗑️ Clear Chat", use_container_width=True):
+        st.session_state.chat_messages = []
+        st.session_state.chat_initialized = False
+        # Full rerun: the greeting is re-fetched outside the fragment
+        st.rerun()
+    
+    # API status indicator
+    if st.session_state.chat_initialized:
+        st.markdown("<div style='text-align: center; font-size: 12px; color: green;'>🟢 AI Assistant Ready</div>", unsafe_allow_html=True)
+    else:
+        st.markdown("<div style='text-align: center; font-size: 12px; color: red;'>🔴 AI Assistant Disconnected</div>", unsafe_allow_html=True)
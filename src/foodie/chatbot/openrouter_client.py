@@ -1,12 +1,53 @@
 import os
-import requests
+import time
+import httpx
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Shared HTTP/2 client so every chat turn reuses the same TCP+TLS connection.
+# The transport retries failed connects; _send retries transient HTTP statuses.
+_http_client = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+    ),
+    timeout=30,
+)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.3
+
+# Prompt budget in tokens; history beyond it is dropped oldest-first.
+# Tokens are estimated at ~4 characters each, which is close enough for
+# trimming and avoids shipping a tokenizer that doesn't match the model anyway.
+PROMPT_TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting purposes"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def trim_messages(messages: List[Dict[str, str]], budget: int = PROMPT_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """Keep all system messages and the newest conversation turns that fit the token budget"""
+    remaining = budget - sum(estimate_tokens(m["content"]) for m in messages if m["role"] == "system")
+    keep = [m["role"] == "system" for m in messages]
+    for i in range(len(messages) - 1, -1, -1):
+        if keep[i]:
+            continue
+        cost = estimate_tokens(messages[i]["content"])
+        # The newest message (the user's question) is always sent
+        if cost > remaining and i != len(messages) - 1:
+            break
+        remaining -= cost
+        keep[i] = True
+    return [m for m, k in zip(messages, keep) if k]
+
 class OpenRouterClient:
     """Client for interacting with OpenRouter API using Llama 3.3 70B Instruct model"""
     
@@ -20,6 +61,23 @@ class OpenRouterClient:
                 "OPENROUTER_API_KEY not found in environment variables. "
                 "Please create a .env file with your OpenRouter API key."
             )
+
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "http://localhost:8501",  # Streamlit default port
+            "X-Title": "Adaptive Nutrition Tracker"
+        }
+    
+    def _send(self, payload: Dict, stream: bool = False) -> httpx.Response:
+        """POST the payload, retrying rate-limit and gateway errors with exponential backoff"""
+        request = _http_client.build_request("POST", self.base_url, headers=self.headers, json=payload)
+        for attempt in range(MAX_RETRIES + 1):
+            response = _http_client.send(request, stream=stream)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            response.close()
+            time.sleep(BACKOFF_FACTOR * (2 ** attempt))
     
     def chat_completion(
         self, 
@@ -30,32 +88,20 @@ class OpenRouterClient:
     ) -> Dict:
         """Send chat completion request to OpenRouter API"""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "http://localhost:8501",  # Streamlit default port
-            "X-Title": "Adaptive Nutrition Tracker"
-        }
-        
         payload = {
             "model": self.model,
-            "messages": messages,
+            "messages": trim_messages(messages),
             "max_tokens": max_tokens,
             "temperature": temperature,
             "stream": stream
         }
         
         try:
-            response = requests.post(
-                self.base_url, 
-                headers=headers, 
-                json=payload,
-                timeout=30
-            )
+            response = self._send(payload)
             response.raise_for_status()
             return response.json()
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "error": f"API request failed: {str(e)}",
                 "choices": [{
@@ -74,6 +120,49 @@ class OpenRouterClient:
                 }]
             }
     
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1000,
+        temperature: float = 0.7
+    ) -> Iterator[str]:
+        """Stream a chat completion, yielding content tokens as they arrive (SSE)"""
+        
+        payload = {
+            "model": self.model,
+            "messages": trim_messages(messages),
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+        
+        try:
+            response = self._send(payload, stream=True)
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    # Skip keep-alive comments and blank separators
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        yield "I'm having trouble connecting to my AI service right now. Please try again in a moment. 🤖"
+                        return
+                    choices = chunk.get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+            finally:
+                response.close()
+                        
+        except httpx.HTTPError:
+            yield "I'm having trouble connecting to my AI service right now. Please try again in a moment. 🤖"
+        except json.JSONDecodeError:
+            yield "I received an unexpected response. Please try again. 🔄"
+    
     def test_connection(self) -> bool:
         """Test if the API connection is working"""
         test_messages = [
@@ -41,7 +41,6 @@ def validate_user_exists(user_id: str) -> User:
 
 def update_user_activity_tracking(user: User):
     user.days_since_last_adaptation += 1
-    user.logs.sort(key=lambda x: x.log_date)
 
 # --- API ENDPOINTS ---
 @app.get("/")
@@ -89,13 +88,8 @@ def add_log(user_id: str, log: LogEntry):
     if log.log_date > date.today():
         raise ValueError("Log date cannot be in the future")
     
-    existing_log = next((l for l in user.logs if l.log_date == log.log_date), None)
-    if existing_log:
-        # Update existing log instead of raising error
-        existing_log.weight_kg = log.weight_kg
-        existing_log.calories_in = log.calories_in
-    else:
-        user.logs.append(log)
+    # Updates the existing log for that date instead of raising an error
+    user.upsert_log(log)
 
     update_user_activity_tracking(user)
     logger.info(f"Added/Updated log for user {user_id} on {log.log_date}")
@@ -107,10 +101,26 @@ def run_kalman_filter_update(user_id: str):
     if len(user.logs) < 2:
         raise HTTPException(status_code=400, detail="Need at least 2 logs for KF update")
     
+    # Logs unchanged since the last sweep: the learned state is already current
+    if not user.needs_kf_update():
+        logger.info(f"KF update for {user_id} skipped, logs unchanged")
+        return user
+    
     updated_user = kalman_filter_model.run_full_kalman_update(user)
+    updated_user.mark_kf_updated()
     logger.info(f"KF update for {user_id}. TDEE: {updated_user.kf_tdee_estimate:.0f}, Conf: {updated_user.adaptation_confidence:.2f}")
     return updated_user
 
+@app.post("/v1/run-kf-update", response_model=Dict[str, Any])
+def run_kalman_filter_update_all():
+    """Refresh every user whose logs changed since their last sweep, in one batched pass"""
+    stale = [user_id for user_id, user in db.items() if len(user.logs) >= 2 and user.needs_kf_update()]
+    kalman_filter_model.run_batch_kalman_update([db[user_id] for user_id in stale])
+    for user_id in stale:
+        db[user_id].mark_kf_updated()
+    logger.info(f"Batch KF update for {len(stale)} of {len(db)} users")
+    return {"updated": stale, "skipped": len(db) - len(stale)}
+
 @app.post("/v1/users/{user_id}/adapt", response_model=Dict[str, Any])
 def adapt_user_goals(user_id: str):
     user = validate_user_exists(user_id)
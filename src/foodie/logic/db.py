@@ -0,0 +1,40 @@
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+
+# ==========================
+# Postgres connection pool
+# ==========================
+# psycopg2 is imported lazily so importing the API (and every worker it forks)
+# stays cheap until a request actually touches the database.
+
+@lru_cache(maxsize=1)
+def get_pool():
+    from psycopg2.pool import ThreadedConnectionPool
+    # Connections are opened once per process and reused across requests
+    return ThreadedConnectionPool(2, 20, dsn=os.environ["DATABASE_URL"], sslmode="require")
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection from the pool and return it afterwards"""
+    pool = get_pool()
+    conn = pool.getconn()
+    # Cheap liveness check: drop connections the server has already closed
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def get_conn():
+    """FastAPI dependency: borrow a pooled connection for the duration of a request.
+
+    Use `with conn:` for the transaction so it commits on success and rolls back
+    on error; putconn() also rolls back anything left open before reuse.
+    """
+    with pooled_connection() as conn:
+        yield conn
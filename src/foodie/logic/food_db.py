@@ -1,8 +1,11 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Depends, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import psycopg2
+from functools import lru_cache
+from itertools import chain
 import os
-from supabase import create_client, Client
+import time
+from foodie.logic.db import get_conn, pooled_connection
 
 app = FastAPI(
     title="Crowdsourced Nutrition API",
@@ -19,11 +22,15 @@ load_dotenv(".env.local")
 DB_URL = os.environ.get("DATABASE_URL") 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def get_connection():
-    return psycopg2.connect(os.environ["DATABASE_URL"], sslmode="require")
+# supabase is a heavy import; defer it until an endpoint actually needs it
+# so importing the app stays cheap. Postgres connections come from foodie.logic.db.
+@lru_cache(maxsize=1)
+def get_supabase():
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
 
 # ==========================
 # Models
@@ -61,201 +68,210 @@ class FoodWithVariant(BaseModel):
 # Endpoints
 # ==========================
 
+# Popular searches repeat constantly; serve them from memory for up to a minute.
+# Searches read Food_Search_View, which only changes on /refresh-view, so that clears it.
+SEARCH_CACHE_TTL = 60
+
+@lru_cache(maxsize=1024)
+def _search(q: str, limit: int, offset: int, ttl_bucket: int) -> list:
+    # Call the RPC function
+    result = get_supabase().rpc(
+        "foods_search",
+        {"q": q, "limit_count": limit, "offset_count": offset}
+    )
+
+    # `.execute()` returns SingleAPIResponse; `.data` contains the actual result
+    return result.execute().data
+
 @app.get("/foods/query")
 def search_foods(
     q: str = Query(..., description="Search query like 'chicken boiled'"),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    response: Response = None
 ):
     """
     Search foods and variants from the crowdsourced nutrition database.
     """
     try:
-        # Call the RPC function
-        result = supabase.rpc(
-            "foods_search",
-            {"q": q, "limit_count": limit, "offset_count": offset}
-        )
-
-        # `.execute()` returns SingleAPIResponse; `.data` contains the actual result
-        return result.execute().data
-
+        ttl_bucket = int(time.monotonic() // SEARCH_CACHE_TTL)
+        results = _search(q.lower().strip(), limit, offset, ttl_bucket)
     except Exception as e:
         # If the RPC fails, raise 500 with the error message
         raise HTTPException(status_code=500, detail=str(e))
 
+    if response is not None:
+        response.headers["Cache-Control"] = f"public, max-age={SEARCH_CACHE_TTL}, stale-while-revalidate=300"
+    # Copy so callers can't mutate the cached list
+    return list(results)
+
+def _nutrients_cte(nutrients: dict):
+    """Extra CTE that inserts the nutrients row for `new_variant`, plus its params (empty if none)"""
+    if not nutrients:
+        return "", []
+    fields = ','.join(nutrients.keys())
+    placeholders = ','.join(['%s']*len(nutrients))
+    cte = f""",
+        new_nutrients AS (
+            INSERT INTO Food_Nutrients (variant_id, {fields}, confidence_score)
+            SELECT variant_id, {placeholders}, 0.5 FROM new_variant
+        )"""
+    return cte, list(nutrients.values())
+
 # 2. Add new food
 @app.post("/foods/add")
-def add_food_with_variant(payload: FoodWithVariant):
+def add_food_with_variant(payload: FoodWithVariant, conn=Depends(get_conn)):
     food = payload.food
     variant = payload.variant
 
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Check if food exists
-    cur.execute("SELECT food_id FROM Foods WHERE LOWER(name) = LOWER(%s)", (food.name,))
-    existing = cur.fetchone()
-    if existing:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=400, detail=f"Food already exists with id {existing[0]}")
-
-    try:
-        # Insert food
-        cur.execute(
-            """
+    # Food, variant and nutrients are created in one statement (one round trip).
+    # The food insert is skipped when the name exists, which then yields no row.
+    nutrients_cte, nutrient_values = _nutrients_cte(variant.nutrients)
+    query = f"""
+        WITH new_food AS (
             INSERT INTO Foods (name, category, is_packaged, barcode)
-            VALUES (%s, %s, %s, %s)
+            SELECT %s, %s, %s, %s
+            WHERE NOT EXISTS (SELECT 1 FROM Foods WHERE LOWER(name) = LOWER(%s))
             RETURNING food_id
-            """,
-            (food.name, food.category, food.is_packaged, food.barcode)
-        )
-        food_id = cur.fetchone()[0]
-
-        # Insert variant
-        cur.execute(
-            """
+        ),
+        new_variant AS (
             INSERT INTO Food_Variants (food_id, variant_label, serving_size, notes)
-            VALUES (%s, %s, %s, %s)
-            RETURNING variant_id
-            """,
-            (food_id, variant.variant_label, variant.serving_size, variant.notes)
-        )
-        variant_id = cur.fetchone()[0]
+            SELECT food_id, %s, %s, %s FROM new_food
+            RETURNING food_id, variant_id
+        ){nutrients_cte}
+        SELECT food_id, variant_id FROM new_variant
+    """
+    params = [food.name, food.category, food.is_packaged, food.barcode, food.name,
+              variant.variant_label, variant.serving_size, variant.notes] + nutrient_values
 
-        # Insert nutrients if provided
-        if variant.nutrients:
-            fields = ','.join(variant.nutrients.keys())
-            placeholders = ','.join(['%s']*len(variant.nutrients))
-            values = list(variant.nutrients.values())
-            query = f"""
-                INSERT INTO Food_Nutrients (variant_id, {fields}, confidence_score)
-                VALUES (%s, {placeholders}, 0.5)
-            """
-            cur.execute(query, [variant_id] + values)
+    # psycopg2 is already loaded once a connection exists
+    from psycopg2.errors import UniqueViolation
 
-        conn.commit()
-        return {"status": "success", "food_id": food_id, "variant_id": variant_id}
+    # `with conn` commits on success and rolls back on any exception
+    with conn, conn.cursor() as cur:
+        try:
+            cur.execute(query, params)
+            created = cur.fetchone()
+        except UniqueViolation:
+            # A concurrent add of the same name won the race on idx_foods_lower_name
+            raise HTTPException(status_code=400, detail="Food already exists")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        if created is None:
+            # Check which food already exists
+            cur.execute("SELECT food_id FROM Foods WHERE LOWER(name) = LOWER(%s)", (food.name,))
+            existing = cur.fetchone()
+            if existing is None:
+                # Deleted again between the insert and this lookup
+                raise HTTPException(status_code=400, detail="Food already exists")
+            raise HTTPException(status_code=400, detail=f"Food already exists with id {existing[0]}")
 
-    finally:
-        cur.close()
-        conn.close()
+    food_id, variant_id = created
+    return {"status": "success", "food_id": food_id, "variant_id": variant_id}
 
 # 3. Add new variant
 @app.post("/variants/add")
-def add_variant(variant: VariantCreate):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO Food_Variants (food_id, variant_label, serving_size, notes)
-        VALUES (%s,%s,%s,%s)
-        RETURNING variant_id
-        """,
-        (variant.food_id, variant.variant_label, variant.serving_size, variant.notes)
-    )
-    variant_id = cur.fetchone()[0]
-
-    # Insert nutrients if provided
-    if variant.nutrients:
-        fields = ','.join(variant.nutrients.keys())
-        placeholders = ','.join(['%s']*len(variant.nutrients))
-        values = list(variant.nutrients.values())
-        query = f"""
-            INSERT INTO Food_Nutrients (variant_id, {fields}, confidence_score)
-            VALUES (%s, {placeholders}, 0.5)
-        """
-        cur.execute(query, [variant_id]+values)
+def add_variant(variant: VariantCreate, conn=Depends(get_conn)):
+    # Variant and nutrients in a single round trip
+    nutrients_cte, nutrient_values = _nutrients_cte(variant.nutrients)
+    query = f"""
+        WITH new_variant AS (
+            INSERT INTO Food_Variants (food_id, variant_label, serving_size, notes)
+            VALUES (%s,%s,%s,%s)
+            RETURNING variant_id
+        ){nutrients_cte}
+        SELECT variant_id FROM new_variant
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            query,
+            [variant.food_id, variant.variant_label, variant.serving_size, variant.notes] + nutrient_values
+        )
+        variant_id = cur.fetchone()[0]
 
-    conn.commit()
-    cur.close()
-    conn.close()
     return {"status": "success", "variant_id": variant_id}
 
 # 4. Add contribution
 @app.post("/contributions")
-def add_contribution(contrib: ContributionCreate):
-    conn = get_connection()
-    cur = conn.cursor()
+def add_contribution(contrib: ContributionCreate, conn=Depends(get_conn)):
     try:
-        cur.execute(
-            """
-            INSERT INTO Contribution_Summary (variant_id, field_name, value)
-            VALUES (%s,%s,%s)
-            ON CONFLICT (variant_id, field_name, value)
-            DO UPDATE SET contribution_count = Contribution_Summary.contribution_count + 1,
-                          last_contributed = NOW()
-            RETURNING contribution_id
-            """,
-            (contrib.variant_id, contrib.field_name, contrib.value)
-        )
-        contrib_id = cur.fetchone()[0]
-        conn.commit()
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO Contribution_Summary (variant_id, field_name, value)
+                VALUES (%s,%s,%s)
+                ON CONFLICT (variant_id, field_name, value)
+                DO UPDATE SET contribution_count = Contribution_Summary.contribution_count + 1,
+                              last_contributed = NOW()
+                RETURNING contribution_id
+                """,
+                (contrib.variant_id, contrib.field_name, contrib.value)
+            )
+            contrib_id = cur.fetchone()[0]
     except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
         raise HTTPException(status_code=400, detail=str(e))
-    cur.close()
-    conn.close()
     return {"status": "success", "contribution_id": contrib_id}
 
 # 5. List variants for a food
+def _stream_variants(food_id: int):
+    """Yield the variants response as JSON chunks, reading rows through a server-side cursor"""
+    # The stream outlives the request handler, so it holds its own pooled connection
+    with pooled_connection() as conn, conn:
+        # A named cursor keeps the result set on the server; rows arrive itersize at a time.
+        # Postgres renders each row as JSON text, so Python only concatenates strings.
+        with conn.cursor(f"variants_{food_id}") as cur:
+            cur.itersize = 500
+            cur.execute(
+                """
+                SELECT json_build_object(
+                    'variant_id', fv.variant_id,
+                    'variant_label', fv.variant_label,
+                    'serving_size', fv.serving_size,
+                    'notes', fv.notes,
+                    'nutrients', json_build_object(
+                        'calories', fn.calories,
+                        'protein', fn.protein,
+                        'carbs', fn.carbs,
+                        'fat', fn.fat,
+                        'fiber', fn.fiber,
+                        'sugar', fn.sugar,
+                        'sodium', fn.sodium
+                    )
+                )::text
+                FROM Food_Variants fv
+                LEFT JOIN Food_Nutrients fn ON fv.variant_id = fn.variant_id
+                WHERE fv.food_id = %s
+                ORDER BY fv.variant_label
+                """,
+                (food_id,)
+            )
+            yield f'{{"food_id":{food_id},"variants":['
+            separator = ""
+            for (variant_json,) in cur:
+                yield separator + variant_json
+                separator = ","
+            yield "]}"
+
 @app.get("/foods/{food_id}/variants")
 def list_variants(food_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT fv.variant_id, fv.variant_label, fv.serving_size, fv.notes,
-               fn.calories, fn.protein, fn.carbs, fn.fat, fn.fiber, fn.sugar, fn.sodium
-        FROM Food_Variants fv
-        LEFT JOIN Food_Nutrients fn ON fv.variant_id = fn.variant_id
-        WHERE fv.food_id = %s
-        ORDER BY fv.variant_label
-        """,
-        (food_id,)
-    )
-    rows = cur.fetchall()
-    variants = []
-    for r in rows:
-        variants.append({
-            "variant_id": r[0],
-            "variant_label": r[1],
-            "serving_size": r[2],
-            "notes": r[3],
-            "nutrients": {
-                "calories": r[4],
-                "protein": r[5],
-                "carbs": r[6],
-                "fat": r[7],
-                "fiber": r[8],
-                "sugar": r[9],
-                "sodium": r[10]
-            }
-        })
-    cur.close()
-    conn.close()
-    return {"food_id": food_id, "variants": variants}
+    chunks = _stream_variants(food_id)
+    # Connect and run the query before the response starts, so failures still become a 500
+    try:
+        first = next(chunks)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(chain([first], chunks), media_type="application/json")
 
 # 6. Refresh materialized view
 @app.post("/refresh-view")
-def refresh_materialized_view():
-    conn = get_connection()
-    cur = conn.cursor()
+def refresh_materialized_view(conn=Depends(get_conn)):
     try:
-        cur.execute("REFRESH MATERIALIZED VIEW Food_Search_View")
-        conn.commit()
+        with conn, conn.cursor() as cur:
+            # CONCURRENTLY keeps the view readable during the refresh and only writes
+            # changed rows; it relies on the unique index from migrations/001.
+            cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY Food_Search_View")
     except Exception as e:
-        conn.rollback()
-        cur.close()
-        conn.close()
         raise HTTPException(status_code=500, detail=str(e))
-    cur.close()
-    conn.close()
-    return {"status": "success", "message": "Materialized view refreshed"}
+    _search.cache_clear()
+    return {"status": "success", "message": "Materialized view refreshed"}
\ No newline at end of file
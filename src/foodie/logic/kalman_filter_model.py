@@ -1,7 +1,7 @@
-from filterpy.kalman import KalmanFilter
+from numba import njit
 import numpy as np
 from foodie.logic.models import LogEntry, User
-from typing import Tuple, List
+from typing import List, NamedTuple, Optional, Tuple
 from datetime import date, timedelta
 import math
 
@@ -21,6 +21,31 @@ MAX_INTERPOLATION_DAYS = 3
 MAX_WEIGHT_CHANGE_PER_DAY = 2.0
 MAX_CALORIE_DEVIATION = 3.0
 
+@njit(cache=True, fastmath=True)
+def _kf_recurrence(z: np.ndarray, x0: float, P0: float, Q: float, R: np.ndarray) -> Tuple[float, float, np.ndarray]:
+    """Scalar 1-D Kalman recurrence (F = H = 1) over all observations, compiled to machine code.
+    
+    Returns the final estimate, final uncertainty and the uncertainty after each step.
+    The Joseph-form covariance update reduces to (1 - K) * P in one dimension.
+    """
+    x = x0
+    P = P0
+    uncertainties = np.empty(z.shape[0])
+    for i in range(z.shape[0]):
+        P += Q                      # predict
+        K = P / (P + R[i])
+        x += K * (z[i] - x)         # update
+        P *= 1.0 - K
+        uncertainties[i] = P
+    return x, P, uncertainties
+
+def warmup_numba():
+    """Compile (or load from the on-disk cache) the jitted recurrence with dummy inputs."""
+    _kf_recurrence(np.zeros(1), 0.0, 1.0, 1.0, np.ones(1))
+
+# Warm up at import so the first request doesn't pay for it
+warmup_numba()
+
 def calculate_adaptive_parameters(user: User) -> Tuple[float, float]:
     """Calculates KF parameters based on user's data quality."""
     base_process = BASE_PROCESS_VARIANCE
@@ -48,28 +73,28 @@ def interpolate_missing_data(log_before: LogEntry, log_after: LogEntry, target_d
     interpolated_weight = log_before.weight_kg + (log_after.weight_kg - log_before.weight_kg) * weight_ratio
     interpolated_calories = int((log_before.calories_in + log_after.calories_in) / 2)
     
-    return LogEntry(log_date=target_date, weight_kg=round(interpolated_weight, 2), calories_in=interpolated_calories)
+    # Internal intermediate built from already-validated entries: skip pydantic validation
+    return LogEntry.model_construct(log_date=target_date, weight_kg=round(interpolated_weight, 2), calories_in=interpolated_calories)
 
 def detect_outliers(logs: List[LogEntry]) -> List[bool]:
     """Detects outlier data points."""
     if len(logs) < 3: return [False] * len(logs)
-    outliers = [False] * len(logs)
     
-    for i in range(1, len(logs)):
-        days_diff = (logs[i].log_date - logs[i-1].log_date).days
-        if days_diff > 0:
-            if abs(logs[i].weight_kg - logs[i-1].weight_kg) / days_diff > MAX_WEIGHT_CHANGE_PER_DAY:
-                outliers[i] = True
+    # Implausible day-over-day weight change (same-day pairs are never flagged)
+    days = np.fromiter((log.log_date.toordinal() for log in logs), dtype=np.int64, count=len(logs))
+    weights = np.fromiter((log.weight_kg for log in logs), dtype=np.float64, count=len(logs))
+    days_diff = np.diff(days)
+    rate = np.abs(np.diff(weights)) / np.where(days_diff > 0, days_diff, 1)
+    outliers = np.zeros(len(logs), dtype=bool)
+    outliers[1:] = (days_diff > 0) & (rate > MAX_WEIGHT_CHANGE_PER_DAY)
     
+    # Calorie intake far from the user's norm
     if len(logs) >= 7:
-        calories = [log.calories_in for log in logs]
-        mean_cal = np.mean(calories)
-        std_cal = np.std(calories)
+        calories = np.fromiter((log.calories_in for log in logs), dtype=np.float64, count=len(logs))
+        std_cal = calories.std()
         if std_cal > 0:
-            for i, log in enumerate(logs):
-                if abs(log.calories_in - mean_cal) / std_cal > MAX_CALORIE_DEVIATION:
-                    outliers[i] = True
-    return outliers
+            outliers |= np.abs(calories - calories.mean()) / std_cal > MAX_CALORIE_DEVIATION
+    return outliers.tolist()
 
 def prepare_continuous_data(logs: List[LogEntry]) -> Tuple[List[LogEntry], List[bool]]:
     """Prepares continuous daily data, handling missing days and outliers."""
@@ -81,93 +106,49 @@ def prepare_continuous_data(logs: List[LogEntry]) -> Tuple[List[LogEntry], List[
     
     if len(clean_logs) < 2: return logs, [False] * len(logs)
     
-    continuous_logs, interpolated_flags = [], []
-    current_log_index = 0
-    start_date = clean_logs[0].log_date
-    end_date = clean_logs[-1].log_date
-    
-    for i in range((end_date - start_date).days + 1):
-        target_date = start_date + timedelta(days=i)
-        
-        if current_log_index < len(clean_logs) and clean_logs[current_log_index].log_date == target_date:
-            continuous_logs.append(clean_logs[current_log_index])
-            interpolated_flags.append(False)
-            current_log_index += 1
-        elif continuous_logs:
-            next_real_log_index = current_log_index
-            if next_real_log_index < len(clean_logs):
-                days_gap = (clean_logs[next_real_log_index].log_date - continuous_logs[-1].log_date).days
-                if days_gap <= MAX_INTERPOLATION_DAYS:
-                    interpolated_log = interpolate_missing_data(continuous_logs[-1], clean_logs[next_real_log_index], target_date)
-                    continuous_logs.append(interpolated_log)
-                    interpolated_flags.append(True)
+    # Walk consecutive pairs of real logs rather than every calendar day, so long
+    # breaks in logging cost nothing. Gaps of up to MAX_INTERPOLATION_DAYS are
+    # filled day by day, each step interpolating from the previous entry;
+    # longer gaps are left open.
+    # Day gaps come from integer ordinals to avoid a timedelta per pair.
+    continuous_logs, interpolated_flags = [clean_logs[0]], [False]
+    prev_ord = clean_logs[0].log_date.toordinal()
+    for log_after in clean_logs[1:]:
+        after_ord = log_after.log_date.toordinal()
+        days_gap = after_ord - prev_ord
+        if days_gap <= MAX_INTERPOLATION_DAYS:
+            for _ in range(days_gap - 1):
+                target_date = continuous_logs[-1].log_date + timedelta(days=1)
+                continuous_logs.append(interpolate_missing_data(continuous_logs[-1], log_after, target_date))
+                interpolated_flags.append(True)
+        continuous_logs.append(log_after)
+        interpolated_flags.append(False)
+        prev_ord = after_ord
     
     return continuous_logs, interpolated_flags
 
-def update_tdee_with_kalman_filter(user: User, log_yesterday: LogEntry, log_today: LogEntry, is_interpolated: bool = False) -> Tuple[float, float, float]:
-    """
-    FIXED: Enhanced Kalman Filter with a numerically stable measurement model.
-    """
-    process_var, measurement_var = calculate_adaptive_parameters(user)
-    if is_interpolated:
-        measurement_var *= 2.0
-    
-    kf = KalmanFilter(dim_x=1, dim_z=1)
-    
-    # State transition: TDEE_today = TDEE_yesterday (with some drift)
-    kf.F = np.array([[1.0]])
-    
-    # --- BUG FIX: STABLE MEASUREMENT MODEL ---
-    # The measurement is now a direct observation of TDEE.
-    # So, H=1, meaning measurement = 1 * TDEE_estimate.
-    kf.H = np.array([[1.0]])
-    
-    # Current state and uncertainty
-    kf.x = np.array([user.kf_tdee_estimate])
-    kf.P = np.array([[user.kf_tdee_uncertainty]])
-    
-    # Noise parameters
-    kf.Q = np.array([[process_var]])
-    kf.R = np.array([[measurement_var]])
-    
-    # --- Predict Step ---
-    kf.predict()
-    
-    # --- Update Step ---
-    days_diff = max(1, (log_today.log_date - log_yesterday.log_date).days)
-    daily_weight_change = (log_today.weight_kg - log_yesterday.weight_kg) / days_diff
-    daily_calories = log_today.calories_in
-    
-    # --- BUG FIX: STABLE MEASUREMENT CALCULATION ---
-    # Our measurement 'z' is the TDEE we observe from this day's data.
-    # z = calories_in - (weight_change * calories_per_kg)
-    z = daily_calories - (daily_weight_change * CALORIES_PER_KG)
-    
-    kf.update(z)
-    
-    # Confidence Score Calculation
-    base_confidence = 1.0 / (1.0 + kf.P[0, 0] / 10000.0)
-    quality_factor = (user.data_quality.weight_consistency_score + user.data_quality.calorie_consistency_score) / 2
-    final_confidence = (base_confidence * 0.7 + quality_factor * 0.3)
-    
-    return float(kf.x[0]), float(kf.P[0, 0]), min(1.0, final_confidence)
+class _KFInputs(NamedTuple):
+    """Everything the recurrence needs for one user's sweep"""
+    z: np.ndarray           # per-step TDEE observations
+    R: np.ndarray           # per-step measurement variance
+    x0: float               # starting TDEE estimate
+    P0: float               # starting uncertainty
+    Q: float                # process variance
+    quality_factor: float   # data-quality weight in the confidence score
 
-def run_full_kalman_update(user: User) -> User:
-    """
-    FIXED: Processes all user logs with a stateful and numerically stable Kalman filter.
-    """
+def _prepare_kf_inputs(user: User) -> Optional[_KFInputs]:
+    """Build the observation arrays and starting state for a sweep, or None if there is too little data."""
     if len(user.logs) < 2:
-        return user
+        return None
     
     user.calculate_data_quality()
     processed_logs, interpolated_flags = prepare_continuous_data(user.logs)
     
     if len(processed_logs) < 2:
-        return user
+        return None
 
     current_tdee = user.kf_tdee_estimate
     current_uncertainty = user.kf_tdee_uncertainty
-    confidence_scores = []
     
     # Reset to initial state only if it's the very first run for this user.
     if user.total_adaptations == 0:
@@ -175,24 +156,78 @@ def run_full_kalman_update(user: User) -> User:
         current_tdee = calculate_initial_tdee(user.profile, processed_logs[0].weight_kg)
         current_uncertainty = 50000.0 # High initial uncertainty
 
-    for i in range(len(processed_logs) - 1):
-        log_yesterday = processed_logs[i]
-        log_today = processed_logs[i + 1]
-        is_interpolated = interpolated_flags[i + 1]
-        
-        # Pass the current state to the update function via the user object
-        user.kf_tdee_estimate = current_tdee
-        user.kf_tdee_uncertainty = current_uncertainty
-        
-        current_tdee, current_uncertainty, confidence = update_tdee_with_kalman_filter(
-            user, log_yesterday, log_today, is_interpolated
-        )
-        confidence_scores.append(confidence)
-    
-    # Persist the final learned state back to the user object
-    user.kf_tdee_estimate = current_tdee
-    user.kf_tdee_uncertainty = current_uncertainty
-    user.adaptation_confidence = np.mean(confidence_scores) if confidence_scores else 0.0
+    # Filter parameters only depend on the user's data quality, so compute them once
+    process_var, measurement_var = calculate_adaptive_parameters(user)
+    quality_factor = (user.data_quality.weight_consistency_score + user.data_quality.calorie_consistency_score) / 2
     
+    # Every day's TDEE observation in one vectorized pass:
+    # z = calories_in - (daily_weight_change * calories_per_kg)
+    dates = np.array([log.log_date for log in processed_logs], dtype="datetime64[D]")
+    weights = np.array([log.weight_kg for log in processed_logs], dtype=np.float64)
+    calories = np.array([log.calories_in for log in processed_logs], dtype=np.float64)
+    days_diff = np.maximum(1, np.diff(dates).astype(np.int64))
+    z = calories[1:] - (np.diff(weights) / days_diff) * CALORIES_PER_KG
+    # Interpolated days are trusted half as much
+    R = np.where(np.asarray(interpolated_flags[1:], dtype=bool), measurement_var * 2.0, measurement_var)
+    
+    return _KFInputs(z, R.astype(np.float64), float(current_tdee), float(current_uncertainty),
+                     float(process_var), quality_factor)
+
+def _store_kf_result(user: User, tdee: float, uncertainty: float, uncertainties: np.ndarray, quality_factor: float):
+    """Persist a finished sweep's state and confidence back to the user object"""
+    # Confidence Score Calculation, per step
+    base_confidence = 1.0 / (1.0 + uncertainties / 10000.0)
+    confidence_scores = np.minimum(1.0, base_confidence * 0.7 + quality_factor * 0.3)
+    
+    user.kf_tdee_estimate = float(tdee)
+    user.kf_tdee_uncertainty = float(uncertainty)
+    user.adaptation_confidence = float(np.mean(confidence_scores))
+
+def run_full_kalman_update(user: User) -> User:
+    """
+    FIXED: Processes all user logs with a stateful and numerically stable Kalman filter.
+    """
+    inputs = _prepare_kf_inputs(user)
+    if inputs is None:
+        return user
+    
+    tdee, uncertainty, uncertainties = _kf_recurrence(inputs.z, inputs.x0, inputs.P0, inputs.Q, inputs.R)
+    _store_kf_result(user, tdee, uncertainty, uncertainties, inputs.quality_factor)
     return user
 
+def run_batch_kalman_update(users: List[User]) -> List[User]:
+    """
+    Same sweep as run_full_kalman_update for many users at once: each day-step
+    advances every user's filter in one vectorized NumPy operation.
+    """
+    prepared = [(user, inputs) for user in users if (inputs := _prepare_kf_inputs(user)) is not None]
+    if not prepared:
+        return users
+    
+    # Pad histories to a common length; steps past a user's last observation are masked out
+    n_users = len(prepared)
+    n_steps = max(len(inputs.z) for _, inputs in prepared)
+    z = np.zeros((n_users, n_steps))
+    R = np.ones((n_users, n_steps))
+    valid = np.zeros((n_users, n_steps), dtype=bool)
+    for i, (_, inputs) in enumerate(prepared):
+        steps = len(inputs.z)
+        z[i, :steps] = inputs.z
+        R[i, :steps] = inputs.R
+        valid[i, :steps] = True
+    
+    x = np.array([inputs.x0 for _, inputs in prepared])
+    P = np.array([inputs.P0 for _, inputs in prepared])
+    Q = np.array([inputs.Q for _, inputs in prepared])
+    uncertainties = np.empty((n_users, n_steps))
+    for t in range(n_steps):
+        active = valid[:, t]
+        P_pred = P + Q
+        K = P_pred / (P_pred + R[:, t])
+        x = np.where(active, x + K * (z[:, t] - x), x)
+        P = np.where(active, (1.0 - K) * P_pred, P)
+        uncertainties[:, t] = P
+    
+    for i, (user, inputs) in enumerate(prepared):
+        _store_kf_result(user, x[i], P[i], uncertainties[i, :len(inputs.z)], inputs.quality_factor)
+    return users
@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_serializer, field_validator
+from typing import Dict, List, NamedTuple, Optional
 from datetime import date
+from operator import attrgetter
+from functools import cached_property
+import bisect
 import math
 import uuid
+import numpy as np
 
 class UserProfile(BaseModel):
     age: int = Field(..., ge=13, le=120, description="Age must be between 13-120")
@@ -17,6 +21,11 @@ class UserProfile(BaseModel):
         if abs(v) > 1.5:
             raise ValueError("Goals above 1.5kg/week are generally unsafe")
         return v
+    
+    @cached_property
+    def gender_lc(self) -> str:
+        """Lower-cased gender, computed once per profile for the TDEE helpers"""
+        return self.gender.lower()
 
 class FoodItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -59,7 +68,24 @@ class DataQualityMetrics(BaseModel):
     weight_consistency_score: float = 1.0  # 0-1, higher = more consistent
     calorie_consistency_score: float = 1.0  # 0-1, higher = more consistent
 
+class LogArrays(NamedTuple):
+    """Read-only struct-of-arrays view of a user's logs, sorted by date"""
+    dates: np.ndarray     # datetime64[D]
+    weights: np.ndarray   # float64
+    calories: np.ndarray  # int64
+
+class FoodArrays(NamedTuple):
+    """Read-only struct-of-arrays view of a user's food items, in insertion order"""
+    dates: np.ndarray     # datetime64[D]
+    calories: np.ndarray  # int64
+    protein: np.ndarray   # float64
+    carbs: np.ndarray     # float64
+    fat: np.ndarray       # float64
+
 class User(BaseModel):
+    # Validate assignments too, so a replaced `logs` list is sorted like a constructed one
+    model_config = ConfigDict(validate_assignment=True)
+    
     user_id: str
     name: str = Field(default="User", description="User's display name")
     profile: UserProfile
@@ -77,7 +103,155 @@ class User(BaseModel):
     data_quality: DataQualityMetrics = Field(default_factory=DataQualityMetrics)
     adaptation_history: List[dict] = Field(default_factory=list)
     logs: List[LogEntry] = Field(default_factory=list)
-    food_items: List[FoodItem] = Field(default_factory=list)
+    # Keyed by FoodItem.id, in insertion order, so deleting an item is a dict pop
+    food_items: Dict[str, FoodItem] = Field(default_factory=dict)
+    
+    # Struct-of-arrays mirror of `logs` for vectorized reads. Buffers grow by
+    # doubling; the key records which state of `logs` they describe.
+    _logs_version: int = PrivateAttr(default=0)
+    _arrays_key: tuple = PrivateAttr(default=())
+    _arrays_len: int = PrivateAttr(default=0)
+    _arr_dates: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0, dtype="datetime64[D]"))
+    _arr_weights: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0, dtype=np.float64))
+    _arr_calories: np.ndarray = PrivateAttr(default_factory=lambda: np.empty(0, dtype=np.int64))
+    # Date -> log index for O(1) "is there a log on this day" checks
+    _log_by_date: Dict[date, LogEntry] = PrivateAttr(default_factory=dict)
+    _log_index_key: tuple = PrivateAttr(default=())
+    # Logs state the Kalman filter last ran on
+    _kf_logs_key: tuple = PrivateAttr(default=())
+    # Logs state data_quality was last computed from
+    _dq_logs_key: tuple = PrivateAttr(default=())
+    # Struct-of-arrays mirror of `food_items` and the food state it describes
+    _food_arrays: Optional[FoodArrays] = PrivateAttr(default=None)
+    _food_arrays_key: tuple = PrivateAttr(default=())
+    _latest_food_date: Optional[np.datetime64] = PrivateAttr(default=None)
+    
+    @field_validator('logs')
+    def sort_logs(cls, v):
+        # upsert_log keeps logs in date order from here on
+        return sorted(v, key=attrgetter("log_date"))
+    
+    @field_validator('food_items', mode='before')
+    def index_food_items(cls, v):
+        # Accept the older list form and key it by item id
+        if isinstance(v, list):
+            return {item["id"] if isinstance(item, dict) else item.id: item for item in v}
+        return v
+    
+    @field_serializer('food_items')
+    def serialize_food_items(self, food_items: Dict[str, FoodItem]) -> List[FoodItem]:
+        # API clients still get the list form; the id keying is internal
+        return list(food_items.values())
+    
+    def _logs_key(self) -> tuple:
+        """Identifies the current contents of `logs` (replaced list, append, or upsert)"""
+        return (id(self.logs), len(self.logs), self._logs_version)
+    
+    def _rebuild_log_arrays(self):
+        """Rebuild the struct-of-arrays buffers from `logs`, which is already date-ordered"""
+        logs = self.logs
+        n = len(logs)
+        capacity = max(16, n)
+        self._arr_dates = np.empty(capacity, dtype="datetime64[D]")
+        self._arr_weights = np.empty(capacity, dtype=np.float64)
+        self._arr_calories = np.empty(capacity, dtype=np.int64)
+        self._arr_dates[:n] = [log.log_date for log in logs]
+        self._arr_weights[:n] = [log.weight_kg for log in logs]
+        self._arr_calories[:n] = [log.calories_in for log in logs]
+        self._arrays_len = n
+        self._arrays_key = self._logs_key()
+    
+    def log_arrays(self) -> LogArrays:
+        """Dates, weights and calories of all logs as sorted NumPy arrays"""
+        if self._arrays_key != self._logs_key():
+            self._rebuild_log_arrays()
+        n = self._arrays_len
+        views = LogArrays(self._arr_dates[:n], self._arr_weights[:n], self._arr_calories[:n])
+        for view in views:
+            view.flags.writeable = False
+        return views
+    
+    def _food_key(self) -> tuple:
+        """Identifies the current contents of `food_items` (replaced dict, added or removed item)"""
+        return (id(self.food_items), len(self.food_items), next(reversed(self.food_items), None))
+    
+    def food_arrays(self) -> FoodArrays:
+        """Dates, calories and macros of all food items as NumPy arrays"""
+        food_key = self._food_key()
+        if self._food_arrays_key != food_key:
+            items = self.food_items.values()
+            arrays = FoodArrays(
+                np.array([item.log_date for item in items], dtype="datetime64[D]"),
+                np.array([item.calories for item in items], dtype=np.int64),
+                np.array([item.protein for item in items], dtype=np.float64),
+                np.array([item.carbs for item in items], dtype=np.float64),
+                np.array([item.fat for item in items], dtype=np.float64),
+            )
+            for array in arrays:
+                array.flags.writeable = False
+            self._food_arrays = arrays
+            self._latest_food_date = arrays.dates.max() if len(arrays.dates) else None
+            self._food_arrays_key = food_key
+        return self._food_arrays
+    
+    def has_recent_food(self, days: int = 30) -> bool:
+        """Whether any food item is dated within the last `days` days"""
+        self.food_arrays()  # refreshes the cached latest date if food_items changed
+        if self._latest_food_date is None:
+            return False
+        return bool(self._latest_food_date >= np.datetime64(date.today(), "D") - np.timedelta64(days, "D"))
+    
+    def log_for_date(self, log_date: date) -> Optional[LogEntry]:
+        """Return the log recorded on the given date, if any"""
+        if self._log_index_key != self._logs_key():
+            self._log_by_date = {log.log_date: log for log in self.logs}
+            self._log_index_key = self._logs_key()
+        return self._log_by_date.get(log_date)
+    
+    def upsert_log(self, log: LogEntry) -> LogEntry:
+        """Add a log, or update the existing entry for the same date. Returns the stored entry."""
+        arrays_fresh = self._arrays_key == self._logs_key()
+        n = self._arrays_len
+        
+        existing_log = self.log_for_date(log.log_date)
+        if existing_log:
+            existing_log.weight_kg = log.weight_kg
+            existing_log.calories_in = log.calories_in
+            self._logs_version += 1
+            self._log_index_key = self._logs_key()
+            if arrays_fresh:
+                idx = int(np.searchsorted(self._arr_dates[:n], np.datetime64(log.log_date, "D")))
+                self._arr_weights[idx] = log.weight_kg
+                self._arr_calories[idx] = log.calories_in
+                self._arrays_key = self._logs_key()
+            return existing_log
+        
+        # Logs are kept in date order, so insert at the right position instead of re-sorting
+        bisect.insort(self.logs, log, key=attrgetter("log_date"))
+        self._logs_version += 1
+        self._log_by_date[log.log_date] = log
+        self._log_index_key = self._logs_key()
+        # Appending a newer date keeps the arrays sorted: grow in place instead of rebuilding
+        if arrays_fresh and (n == 0 or np.datetime64(log.log_date, "D") > self._arr_dates[n - 1]):
+            if n == len(self._arr_dates):
+                capacity = max(16, 2 * n)
+                self._arr_dates = np.resize(self._arr_dates, capacity)
+                self._arr_weights = np.resize(self._arr_weights, capacity)
+                self._arr_calories = np.resize(self._arr_calories, capacity)
+            self._arr_dates[n] = log.log_date
+            self._arr_weights[n] = log.weight_kg
+            self._arr_calories[n] = log.calories_in
+            self._arrays_len = n + 1
+            self._arrays_key = self._logs_key()
+        return log
+    
+    def needs_kf_update(self) -> bool:
+        """Whether logs changed since the Kalman state was last marked current"""
+        return self._kf_logs_key != self._logs_key()
+    
+    def mark_kf_updated(self):
+        """Record that the Kalman state reflects the current logs"""
+        self._kf_logs_key = self._logs_key()
     
     def add_adaptation_record(self, old_goal: int, new_goal: int, reason: str, confidence: float):
         """Add a record of goal adaptation with reasoning"""
@@ -94,48 +268,44 @@ class User(BaseModel):
     
     def get_recent_logs(self, days: int = 14) -> List[LogEntry]:
         """Get logs from the last N days, sorted chronologically"""
-        if not self.logs: return []
-        sorted_logs = sorted(self.logs, key=lambda x: x.log_date, reverse=True)
-        recent_logs = sorted_logs[:days] if len(sorted_logs) >= days else sorted_logs
-        return sorted(recent_logs, key=lambda x: x.log_date)
+        # logs is date-ordered, so the recent window is a tail slice: O(days), not O(len(logs))
+        return self.logs[max(0, len(self.logs) - days):]
     
     def calculate_data_quality(self):
         """Calculate data quality metrics for adaptive parameter tuning"""
         if len(self.logs) < 2: return
-        sorted_logs = sorted(self.logs, key=lambda x: x.log_date)
-        
-        total_days = (sorted_logs[-1].log_date - sorted_logs[0].log_date).days + 1
-        gaps = []
-        consecutive_streak = 1
-        max_consecutive = 1
+        # Metrics depend only on the logs; skip the recompute if they haven't changed
+        logs_key = self._logs_key()
+        if self._dq_logs_key == logs_key: return
+        arrays = self.log_arrays()
         
-        for i in range(1, len(sorted_logs)):
-            gap = (sorted_logs[i].log_date - sorted_logs[i-1].log_date).days
-            if gap == 1:
-                consecutive_streak += 1
-                max_consecutive = max(max_consecutive, consecutive_streak)
-            else:
-                gaps.append(gap - 1)
-                consecutive_streak = 1
+        # Day gaps between consecutive logs; a gap of 1 continues a streak
+        day_gaps = np.diff(arrays.dates).astype(np.int64)
+        breaks = np.flatnonzero(day_gaps != 1)
+        # Streak lengths in days are the distances between consecutive breaks
+        max_consecutive = int(np.diff(np.concatenate(([-1], breaks, [len(day_gaps)]))).max())
+        missed_days = day_gaps[breaks] - 1
         
-        recent_weights = [log.weight_kg for log in sorted_logs[-14:]]
+        # Population variance over the last 14 logs
+        recent_weights = arrays.weights[-14:]
         if len(recent_weights) > 1:
-            weight_var = sum((w - sum(recent_weights)/len(recent_weights))**2 for w in recent_weights) / len(recent_weights)
+            weight_var = float(recent_weights.var())
             weight_consistency = max(0, 1 - (weight_var / 10))
         else: weight_consistency = 1.0
         
-        recent_calories = [log.calories_in for log in sorted_logs[-14:] if log.calories_in > 0]
+        recent_calories = arrays.calories[-14:]
+        recent_calories = recent_calories[recent_calories > 0].astype(np.float64)
         if len(recent_calories) > 1:
-            cal_mean = sum(recent_calories) / len(recent_calories)
-            cal_var = sum((c - cal_mean)**2 for c in recent_calories) / len(recent_calories)
+            cal_var = float(recent_calories.var())
             calorie_consistency = max(0, 1 - (cal_var / 200000))
         else: calorie_consistency = 1.0
         
         self.data_quality = DataQualityMetrics(
             consecutive_days=max_consecutive,
-            total_days_logged=len(sorted_logs),
-            average_gap_days=sum(gaps) / len(gaps) if gaps else 0,
+            total_days_logged=len(arrays.dates),
+            average_gap_days=float(missed_days.mean()) if len(missed_days) else 0,
             weight_consistency_score=weight_consistency,
             calorie_consistency_score=calorie_consistency
         )
+        self._dq_logs_key = logs_key
 
@@ -1,8 +1,10 @@
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from datetime import date
+from operator import attrgetter
+import heapq
 import uuid
-import pandas as pd
+import numpy as np
 
 class UserProfile(BaseModel):
     age: int = Field(..., ge=13, le=120)
@@ -69,9 +71,10 @@ class User(BaseModel):
     def get_recent_logs(self, days: int = 14) -> List[LogEntry]:
         if not self.logs:
             return []
-        sorted_logs = sorted(self.logs, key=lambda x: x.log_date, reverse=True)
-        recent_logs = sorted_logs[:days]
-        return sorted(recent_logs, key=lambda x: x.log_date)
+        # Select the newest `days` logs in O(N log k) instead of sorting everything
+        recent_logs = heapq.nlargest(days, self.logs, key=attrgetter("log_date"))
+        recent_logs.sort(key=attrgetter("log_date"))
+        return recent_logs
     
     def calculate_data_quality(self):
         if len(self.logs) < 2:
@@ -94,14 +97,14 @@ class User(BaseModel):
         
         recent_weights = [log.weight_kg for log in sorted_logs[-14:]]
         if len(recent_weights) > 1:
-            weight_var = pd.Series(recent_weights).var()
+            weight_var = np.var(recent_weights, ddof=1)  # sample variance, as pandas computed it
             weight_consistency = max(0, 1 - (weight_var / 2.0))
         else:
             weight_consistency = 1.0
         
         recent_calories = [log.calories_in for log in sorted_logs[-14:] if log.calories_in > 0]
         if len(recent_calories) > 1:
-            cal_var = pd.Series(recent_calories).var()
+            cal_var = np.var(recent_calories, ddof=1)
             calorie_consistency = max(0, 1 - (cal_var / 100000))
         else:
             calorie_consistency = 1.0
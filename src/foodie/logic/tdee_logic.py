@@ -1,6 +1,6 @@
 from foodie.logic.models import User, UserProfile, MacroTargets
-from typing import Tuple, Optional
-import math
+from typing import NamedTuple, Tuple, Optional
+from functools import lru_cache
 
 # --- CONTROL PARAMETERS ---
 MIN_ADAPTATION_INTERVAL = 7
@@ -8,13 +8,16 @@ CONFIDENCE_THRESHOLD = 0.3
 CALORIES_PER_KG = 7700.0
 
 # --- TDEE CALCULATION FORMULAS ---
+@lru_cache(maxsize=1024)
+def _mifflin_st_jeor(weight_kg: float, height_cm: float, age: int, is_male: bool) -> float:
+    """Mifflin-St Jeor on primitives, memoized since profiles repeat across calls."""
+    if is_male:
+        return 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
+    return 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
+
 def calculate_bmr_mifflin_st_jeor(profile: UserProfile, weight_kg: float) -> float:
     """Calculate BMR using Mifflin-St Jeor equation."""
-    if profile.gender.lower() == 'male':
-        bmr = 10 * weight_kg + 6.25 * profile.height_cm - 5 * profile.age + 5
-    else:
-        bmr = 10 * weight_kg + 6.25 * profile.height_cm - 5 * profile.age - 161
-    return bmr
+    return _mifflin_st_jeor(weight_kg, profile.height_cm, profile.age, profile.gender_lc == 'male')
 
 def calculate_initial_tdee(profile: UserProfile, weight_kg: float) -> float:
     """Calculate initial TDEE estimate using standard formulas."""
@@ -23,43 +26,49 @@ def calculate_initial_tdee(profile: UserProfile, weight_kg: float) -> float:
     return tdee
 
 # --- MACRO NUTRIENT CALCULATION ---
+class _MacroSplit(NamedTuple):
+    protein_pct: float
+    carbs_pct: float
+    fat_pct: float
+    protein_per_kg: float  # minimum protein by body weight
+    carbs_share: float     # carbs' part of the calories left after protein
+    fat_share: float       # fat's part of the calories left after protein
+
+def _macro_split(protein_pct: float, carbs_pct: float, fat_pct: float, protein_per_kg: float) -> _MacroSplit:
+    return _MacroSplit(protein_pct, carbs_pct, fat_pct, protein_per_kg,
+                       carbs_pct / (carbs_pct + fat_pct), fat_pct / (carbs_pct + fat_pct))
+
+# Macro distributions keyed by (goal type, is male), precomputed once
+_MACRO_SPLITS = {
+    # Higher protein for muscle preservation, moderate carbs, lower fat
+    ("weight_loss", True): _macro_split(0.30, 0.40, 0.30, 1.6),
+    ("weight_loss", False): _macro_split(0.28, 0.40, 0.30, 1.6),
+    # High protein for muscle building, higher carbs for energy, moderate fat
+    ("weight_gain", True): _macro_split(0.25, 0.50, 0.25, 1.8),
+    ("weight_gain", False): _macro_split(0.25, 0.50, 0.25, 1.8),
+    # Balanced approach
+    ("maintenance", True): _macro_split(0.25, 0.45, 0.30, 1.2),
+    ("maintenance", False): _macro_split(0.25, 0.45, 0.30, 1.2),
+}
+
 def calculate_macro_targets(calorie_goal: int, profile: UserProfile, current_weight: float) -> MacroTargets:
     """
     Calculate macro nutrient targets based on calorie goal and user profile.
     Uses evidence-based macro distributions based on goals.
     """
     # Determine goal type based on weekly weight change target
-    goal_type = "maintenance"
-    if profile.goal_kg_per_week < -0.1:
-        goal_type = "weight_loss"
-    elif profile.goal_kg_per_week > 0.1:
-        goal_type = "weight_gain"
-    
-    # Macro percentages based on goal and gender
-    if goal_type == "weight_loss":
-        # Higher protein for muscle preservation, moderate carbs, lower fat
-        protein_pct = 0.30 if profile.gender.lower() == 'male' else 0.28
-        carbs_pct = 0.40
-        fat_pct = 0.30
-    elif goal_type == "weight_gain":
-        # High protein for muscle building, higher carbs for energy, moderate fat
-        protein_pct = 0.25
-        carbs_pct = 0.50
-        fat_pct = 0.25
-    else:  # maintenance
-        # Balanced approach
-        protein_pct = 0.25
-        carbs_pct = 0.45
-        fat_pct = 0.30
+    goal_type = ("weight_loss" if profile.goal_kg_per_week < -0.1
+                 else "weight_gain" if profile.goal_kg_per_week > 0.1
+                 else "maintenance")
+    split = _MACRO_SPLITS[goal_type, profile.gender_lc == 'male']
     
     # Calculate protein needs (minimum based on body weight)
-    protein_per_kg = 1.6 if goal_type == "weight_loss" else 1.2 if goal_type == "maintenance" else 1.8
-    min_protein_g = current_weight * protein_per_kg
+    min_protein_g = current_weight * split.protein_per_kg
     
     # Calculate macros from percentages
-    protein_from_calories = (calorie_goal * protein_pct) / 4
-    carbs_g = (calorie_goal * carbs_pct) / 4
-    fat_g = (calorie_goal * fat_pct) / 9
+    protein_from_calories = (calorie_goal * split.protein_pct) / 4
+    carbs_g = (calorie_goal * split.carbs_pct) / 4
+    fat_g = (calorie_goal * split.fat_pct) / 9
     
     # Use the higher of percentage-based or body weight-based protein
     protein_g = max(protein_from_calories, min_protein_g)
@@ -70,11 +79,8 @@ def calculate_macro_targets(calorie_goal: int, profile: UserProfile, current_wei
     
     if remaining_calories > 0:
         # Redistribute remaining calories between carbs and fat
-        carbs_calories = remaining_calories * (carbs_pct / (carbs_pct + fat_pct))
-        fat_calories = remaining_calories * (fat_pct / (carbs_pct + fat_pct))
-        
-        carbs_g = carbs_calories / 4
-        fat_g = fat_calories / 9
+        carbs_g = remaining_calories * split.carbs_share / 4
+        fat_g = remaining_calories * split.fat_share / 9
     
     return MacroTargets(
         protein_g=round(protein_g, 1),
@@ -82,20 +88,27 @@ def calculate_macro_targets(calorie_goal: int, profile: UserProfile, current_wei
         fat_g=round(fat_g, 1)
     )
 
-def generate_adaptation_explanation(old_tdee: int, new_tdee: int, confidence: float, old_goal: int, new_goal: int) -> str:
-    """Generate human-readable explanation for goal changes based on TDEE updates."""
+_STABLE_EXPLANATION = "Your metabolism appears stable. Your goal remains at {new_goal} kcal based on the latest data."
+_CHANGED_EXPLANATION = ("Based on your recent progress, your estimated maintenance (TDEE) has {direction} "
+                        "from {old_tdee} to {new_tdee} kcal. This adjustment was made with {confidence_desc} confidence. "
+                        "As a result, your calorie goal has been updated from {old_goal} to {new_goal} kcal to keep you on track.")
+
+@lru_cache(maxsize=256)
+def _format_explanation(old_tdee: int, new_tdee: int, confidence_desc: str, old_goal: int, new_goal: int) -> str:
+    """Render the explanation; keyed on the bucketed confidence so repeated snapshots hit the cache."""
     tdee_change = new_tdee - old_tdee
     
     if abs(tdee_change) < 25:
-        return f"Your metabolism appears stable. Your goal remains at {new_goal} kcal based on the latest data."
+        return _STABLE_EXPLANATION.format(new_goal=new_goal)
 
     direction = "increased" if tdee_change > 0 else "decreased"
+    return _CHANGED_EXPLANATION.format(direction=direction, old_tdee=old_tdee, new_tdee=new_tdee,
+                                       confidence_desc=confidence_desc, old_goal=old_goal, new_goal=new_goal)
+
+def generate_adaptation_explanation(old_tdee: int, new_tdee: int, confidence: float, old_goal: int, new_goal: int) -> str:
+    """Generate human-readable explanation for goal changes based on TDEE updates."""
     confidence_desc = "high" if confidence > 0.7 else "moderate" if confidence > 0.4 else "low"
-    
-    explanation = (f"Based on your recent progress, your estimated maintenance (TDEE) has {direction} "
-                   f"from {old_tdee} to {new_tdee} kcal. This adjustment was made with {confidence_desc} confidence. "
-                   f"As a result, your calorie goal has been updated from {old_goal} to {new_goal} kcal to keep you on track.")
-    return explanation
+    return _format_explanation(old_tdee, new_tdee, confidence_desc, old_goal, new_goal)
 
 def run_adaptive_update(user: User) -> Tuple[int, str]:
     """
@@ -104,43 +117,49 @@ def run_adaptive_update(user: User) -> Tuple[int, str]:
     based on the latest TDEE estimate from the Kalman Filter.
     Also updates macro targets when calorie goals change.
     """
-    # Check minimum data requirements
-    if len(user.logs) < 7:
+    # Gates run cheapest-first and return before any history or profile lookups
+    logs = user.logs
+    if len(logs) < 7:
         return user.adapted_calorie_goal, "Insufficient data - need at least 7 days of logs to adapt."
     
-    # Check adaptation interval
-    if user.days_since_last_adaptation < MIN_ADAPTATION_INTERVAL:
-        days_left = MIN_ADAPTATION_INTERVAL - user.days_since_last_adaptation
+    # Check adaptation interval (rejects most calls)
+    days_since_last_adaptation = user.days_since_last_adaptation
+    if days_since_last_adaptation < MIN_ADAPTATION_INTERVAL:
+        days_left = MIN_ADAPTATION_INTERVAL - days_since_last_adaptation
         return user.adapted_calorie_goal, f"Next adaptation available in {days_left} days."
     
     # Check confidence threshold
-    if user.adaptation_confidence < CONFIDENCE_THRESHOLD:
-        return user.adapted_calorie_goal, f"Confidence too low ({user.adaptation_confidence:.2f}) - need more consistent data to adapt."
+    confidence = user.adaptation_confidence
+    if confidence < CONFIDENCE_THRESHOLD:
+        return user.adapted_calorie_goal, f"Confidence too low ({confidence:.2f}) - need more consistent data to adapt."
 
     # --- CORE GOAL CALCULATION (THE FIX) ---
     # The Kalman Filter has already updated the TDEE estimate.
     # The new goal is simply the new TDEE +/- the deficit/surplus for the user's goal.
+    profile = user.profile
+    kf_tdee = user.kf_tdee_estimate
     
-    old_tdee = int(user.adaptation_history[-1].get('tdee_estimate', user.kf_tdee_estimate)) if user.adaptation_history else int(user.kf_tdee_estimate)
-    latest_tdee = int(user.kf_tdee_estimate)
+    old_tdee = int(user.adaptation_history[-1].get('tdee_estimate', kf_tdee) if user.adaptation_history else kf_tdee)
+    latest_tdee = int(kf_tdee)
     
-    target_daily_surplus = (user.profile.goal_kg_per_week * CALORIES_PER_KG) / 7
+    target_daily_surplus = (profile.goal_kg_per_week * CALORIES_PER_KG) / 7
     
     # The new goal is a direct calculation from the latest TDEE estimate.
     new_goal = int(latest_tdee + target_daily_surplus)
     
-    # Validate the goal is within safe bounds
-    validated_goal, warning = validate_calorie_goal(new_goal, user)
+    # Validate the goal is within safe bounds (BMR computed once for this update)
+    current_weight = logs[-1].weight_kg
+    bmr = calculate_bmr_mifflin_st_jeor(profile, current_weight)
+    validated_goal, warning = validate_calorie_goal(new_goal, user, current_weight=current_weight, bmr=bmr)
     
     # Update macro targets when calorie goal changes
-    current_weight = user.logs[-1].weight_kg if user.logs else user.profile.goal_weight_kg
-    user.macro_targets = calculate_macro_targets(validated_goal, user.profile, current_weight)
+    user.macro_targets = calculate_macro_targets(validated_goal, profile, current_weight)
     
     # Generate explanation based on the change in TDEE
     explanation = generate_adaptation_explanation(
         old_tdee=old_tdee,
         new_tdee=latest_tdee,
-        confidence=user.adaptation_confidence,
+        confidence=confidence,
         old_goal=user.adapted_calorie_goal,
         new_goal=validated_goal
     )
@@ -150,10 +169,14 @@ def run_adaptive_update(user: User) -> Tuple[int, str]:
 
     return validated_goal, explanation
 
-def validate_calorie_goal(goal: int, user: User) -> Tuple[int, str]:
-    """Validate that calorie goal is within safe/reasonable bounds."""
-    current_weight = user.logs[-1].weight_kg if user.logs else 70
-    bmr = calculate_bmr_mifflin_st_jeor(user.profile, current_weight)
+def validate_calorie_goal(goal: int, user: User, *, current_weight: Optional[float] = None,
+                          bmr: Optional[float] = None) -> Tuple[int, str]:
+    """Validate that calorie goal is within safe/reasonable bounds.
+    Pass `current_weight` and/or `bmr` if already known to skip recomputing them."""
+    if bmr is None:
+        if current_weight is None:
+            current_weight = user.logs[-1].weight_kg if user.logs else 70
+        bmr = calculate_bmr_mifflin_st_jeor(user.profile, current_weight)
     min_safe_calories = int(bmr) # BMR is a safe floor
     
     # Maximum reasonable calories (TDEE + 1000)
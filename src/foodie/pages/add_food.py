@@ -1,9 +1,30 @@
 import streamlit as st
-import time
 from foodie.logic.models import User, FoodItem
 from foodie.logic.food_db import search_foods
 from datetime import date
 
+def _build_search_options(results) -> dict:
+    """Map "food_name variant_label" display names to their name and nutrients"""
+    options = {}
+    for food in results:
+        food_name = food.get("food_name", "Unknown")
+        variants = food.get("variants", [])
+        for variant in variants:
+            label = variant.get("variant_label", "Standard")
+            # Format: "food_name variant_label"
+            display_name = f"{food_name} {label}"
+            options[display_name] = {
+                "name": display_name,
+                "nutrients": variant.get("nutrients", {})
+            }
+    return options
+
+def _set_search_results(results):
+    """Store results together with the dropdown options derived from them"""
+    st.session_state.search_results = results
+    st.session_state.search_options = _build_search_options(results)
+    st.session_state.search_select_options = ["Select..."] + list(st.session_state.search_options)
+
 @st.dialog("Add Food Item")
 def add_food_dialog(user: User, meal_type: str, log_date: date):
     """A dialog to add a new food item with search functionality."""
@@ -13,7 +34,7 @@ def add_food_dialog(user: User, meal_type: str, log_date: date):
     if "search_query" not in st.session_state:
         st.session_state.search_query = ""
     if "search_results" not in st.session_state:
-        st.session_state.search_results = []
+        _set_search_results([])
     if "last_selected_food" not in st.session_state:
         st.session_state.last_selected_food = "Select..."
 
@@ -23,39 +44,28 @@ def add_food_dialog(user: User, meal_type: str, log_date: date):
     
     # Check if query changed to trigger search
     # Note: st.text_input updates session_state['food_search_input'] on enter/blur
+    # Case and surrounding whitespace don't change the results, so they don't re-search
+    query = query.strip().lower()
     if query != st.session_state.search_query:
         st.session_state.search_query = query
         if query:
             with st.spinner("Searching..."):
-                time.sleep(2) # Debounce simulation
                 try:
-                    # Call the API function
+                    # Call the API function (results are memoized in food_db)
                     results = search_foods(q=query, limit=10, offset=0)
-                    st.session_state.search_results = results
+                    _set_search_results(results)
                 except Exception as e:
                     st.error(f"Search failed: {e}")
-                    st.session_state.search_results = []
+                    _set_search_results([])
         else:
-            st.session_state.search_results = []
+            _set_search_results([])
 
-    # Process Results for Dropdown
-    options = {}
-    if st.session_state.search_results:
-        for food in st.session_state.search_results:
-            food_name = food.get("food_name", "Unknown")
-            variants = food.get("variants", [])
-            for variant in variants:
-                label = variant.get("variant_label", "Standard")
-                # Format: "food_name variant_label"
-                display_name = f"{food_name} {label}"
-                options[display_name] = {
-                    "name": display_name,
-                    "nutrients": variant.get("nutrients", {})
-                }
+    # Dropdown options are built once per result set, not on every rerun
+    options = st.session_state.search_options
     
     # Dropdown Selection
     # We use a key to track selection
-    selected_item_name = st.selectbox("Select Item", options=["Select..."] + list(options.keys()), key="food_search_select")
+    selected_item_name = st.selectbox("Select Item", options=st.session_state.search_select_options, key="food_search_select")
     
     # Auto-populate logic
     if selected_item_name != st.session_state.last_selected_food:
@@ -105,11 +115,12 @@ def add_food_dialog(user: User, meal_type: str, log_date: date):
                 carbs=carbs_val,
                 fat=fat_val,
             )
-            user.food_items.append(new_food)
+            user.food_items[new_food.id] = new_food
             
             # Delete keys from session state to avoid widget key conflicts
             for key in ["form_name", "form_cals", "form_prot", "form_carbs", "form_fat",
                        "food_search_input", "search_query", "search_results", 
+                       "search_options", "search_select_options",
                        "last_selected_food", "food_search_select", "add_food_error"]:
                 if key in st.session_state:
                     del st.session_state[key]
@@ -0,0 +1,86 @@
+import math
+import string
+
+# Dashboard widget markup and keys. These live outside streamlit_app.py because
+# Streamlit re-executes the app script on every rerun, while imported modules
+# (and the constants below) are built once per process.
+
+# Ring geometry is fixed, so derive it once
+RING_SIZE = 120
+RING_CENTER = RING_SIZE / 2
+RING_RADIUS = 45
+RING_CIRCUMFERENCE = 2 * math.pi * RING_RADIUS
+
+# The ring markup is static apart from a few values: geometry is baked in at import
+# and the rest is filled in with a single Template.substitute() per ring
+_RING_TEMPLATE = string.Template(f"""
+    <div style="display: flex; flex-direction: column; align-items: center; margin: 10px;">
+        <div style="position: relative; width: {RING_SIZE}px; height: {RING_SIZE}px;">
+            <svg width="{RING_SIZE}" height="{RING_SIZE}" style="transform: rotate(-90deg);">
+                <!-- Background circle -->
+                <circle
+                    cx="{RING_CENTER}" cy="{RING_CENTER}" r="{RING_RADIUS}"
+                    stroke="#e6e6e6"
+                    stroke-width="8"
+                    fill="transparent"
+                />
+                <!-- Progress circle -->
+                <circle
+                    cx="{RING_CENTER}" cy="{RING_CENTER}" r="{RING_RADIUS}"
+                    stroke="$color"
+                    stroke-width="8"
+                    stroke-linecap="round"
+                    fill="transparent"
+                    stroke-dasharray="{RING_CIRCUMFERENCE}"
+                    stroke-dashoffset="$dashoffset"
+                    style="transition: stroke-dashoffset 0.5s ease-in-out;"
+                />
+            </svg>
+            <!-- Center text -->
+            <div style="
+                position: absolute;
+                top: 50%;
+                left: 50%;
+                transform: translate(-50%, -50%);
+                text-align: center;
+                font-family: sans-serif;
+            ">
+                <div style="font-size: 18px; font-weight: bold; color: $color;">
+                    $current$unit
+                </div>
+                <div style="font-size: 12px; color: #666; margin-top: 2px;">
+                    $percentage%
+                </div>
+            </div>
+        </div>
+        <!-- Label -->
+        <div style="margin-top: 8px; text-align: center;">
+            <div style="font-size: 14px; font-weight: bold;">$name</div>
+            <div style="font-size: 12px; color: #666;">$target$unit left</div>
+        </div>
+    </div>
+    """)
+
+def create_macro_progress_ring(name: str, current: float, target: float, unit: str = "g", color: str = "#1f77b4"):
+    """Create a circular progress ring showing macro progress towards target"""
+    progress = min(current / target, 1.0) if target > 0 else 0
+    return _RING_TEMPLATE.substitute(
+        name=name,
+        unit=unit,
+        color=color,
+        current=f"{current:.0f}",
+        target=f"{target:.0f}",
+        percentage=f"{progress * 100:.0f}",
+        dashoffset=RING_CIRCUMFERENCE * (1 - progress),
+    )
+
+def combine_macro_rings(*rings: str) -> str:
+    """Lay out progress rings in one row so they render with a single st.markdown call"""
+    # No blank lines inside, or markdown would end the HTML block early
+    return ('<div style="display: flex; justify-content: space-around;">\n'
+            + "\n".join(ring.strip() for ring in rings)
+            + "\n</div>")
+
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+# Widget labels and keys are fixed per meal, so build each string once
+MEAL_ADD_BUTTONS = {meal: (f"＋ Add to {meal}", f"add_{meal}") for meal in MEAL_TYPES}
@@ -1,83 +1,42 @@
 import streamlit as st
 import pandas as pd
+import copy
 from datetime import date, timedelta
 import math
-from typing import List
-import altair as alt
+import numpy as np
 
 # Import the backend logic and the updated models
-from foodie.logic.models import UserProfile, LogEntry, User, FoodItem
-import foodie.logic.tdee_logic as tdee_logic
+from foodie.logic.models import UserProfile, LogEntry, User
 import foodie.logic.kalman_filter_model as kalman_filter_model  
 import foodie.logic.adaptive_service as main # We will "monkey-patch" its in-memory DB
+import foodie.pages.user_setup  # swaps in main.create_user, once per process
 from foodie.pages.add_food import add_food_dialog
+from foodie.pages.dashboard_widgets import (
+    MEAL_TYPES, MEAL_ADD_BUTTONS, create_macro_progress_ring, combine_macro_rings
+)
 from foodie.pages.visualizations import visualizations_page
 from foodie.pages.performance import performance_page
 from foodie.chatbot import render_chat_assistant
 
 # --- HELPER FUNCTIONS ---
 
-def create_macro_progress_ring(name: str, current: float, target: float, unit: str = "g", color: str = "#1f77b4"):
-    """Create a circular progress ring showing macro progress towards target"""
-    progress = min(current / target, 1.0) if target > 0 else 0
-    percentage = progress * 100
-    
-    # Create SVG for circular progress
-    size = 120
-    center = size / 2
-    radius = 45
-    circumference = 2 * math.pi * radius
-    stroke_dasharray = circumference
-    stroke_dashoffset = circumference * (1 - progress)
-    
-    svg = f"""
-    <div style="display: flex; flex-direction: column; align-items: center; margin: 10px;">
-        <div style="position: relative; width: {size}px; height: {size}px;">
-            <svg width="{size}" height="{size}" style="transform: rotate(-90deg);">
-                <!-- Background circle -->
-                <circle
-                    cx="{center}" cy="{center}" r="{radius}"
-                    stroke="#e6e6e6"
-                    stroke-width="8"
-                    fill="transparent"
-                />
-                <!-- Progress circle -->
-                <circle
-                    cx="{center}" cy="{center}" r="{radius}"
-                    stroke="{color}"
-                    stroke-width="8"
-                    stroke-linecap="round"
-                    fill="transparent"
-                    stroke-dasharray="{stroke_dasharray}"
-                    stroke-dashoffset="{stroke_dashoffset}"
-                    style="transition: stroke-dashoffset 0.5s ease-in-out;"
-                />
-            </svg>
-            <!-- Center text -->
-            <div style="
-                position: absolute;
-                top: 50%;
-                left: 50%;
-                transform: translate(-50%, -50%);
-                text-align: center;
-                font-family: sans-serif;
-            ">
-                <div style="font-size: 18px; font-weight: bold; color: {color};">
-                    {current:.0f}{unit}
-                </div>
-                <div style="font-size: 12px; color: #666; margin-top: 2px;">
-                    {percentage:.0f}%
-                </div>
-            </div>
-        </div>
-        <!-- Label -->
-        <div style="margin-top: 8px; text-align: center;">
-            <div style="font-size: 14px; font-weight: bold;">{name}</div>
-            <div style="font-size: 12px; color: #666;">{target:.0f}{unit} left</div>
-        </div>
-    </div>
-    """
-    return svg
+# Quick Charts weight trend as a plain Vega-Lite spec; skips Altair's schema
+# validation on every rerun. The y domain is filled in per render.
+WEIGHT_TREND_SPEC = {
+    "mark": {"type": "line", "color": "#1f77b4", "point": True},
+    "encoding": {
+        "x": {"field": "log_date", "type": "temporal", "title": "Date"},
+        "y": {"field": "weight_kg", "type": "quantitative", "title": "Weight (kg)",
+              "scale": {"domain": None, "clamp": True}},
+        "tooltip": [
+            {"field": "log_date", "type": "temporal"},
+            {"field": "weight_kg", "type": "quantitative"},
+        ],
+    },
+    # Zoom and pan, as Altair's .interactive() adds
+    "params": [{"name": "zoom", "select": "interval", "bind": "scales"}],
+}
+WEIGHT_TREND_ZOOM_MIN_POINTS = 30
 
 def calculate_time_to_goal(user: User):
     """Estimates the time to reach the goal weight."""
@@ -108,14 +67,29 @@ def calculate_time_to_goal(user: User):
     body = f"to reach your goal of {goal_weight} kg. That's approximately {estimated_days} days."
     return title, body
 
-def get_daily_food_summary(food_items: List[FoodItem], log_date: date):
+# Below this many items one plain loop beats building the arrays and masking them
+FOOD_ARRAYS_MIN_ITEMS = 256
+
+def get_daily_food_summary(user: User, log_date: date):
     """Calculates total calories and macros for a given day."""
-    daily_items = [item for item in food_items if item.log_date == log_date]
+    food_items = user.food_items
+    if len(food_items) < FOOD_ARRAYS_MIN_ITEMS:
+        calories, protein, carbs, fat = 0, 0.0, 0.0, 0.0
+        for item in food_items.values():
+            if item.log_date == log_date:
+                calories += item.calories
+                protein += item.protein
+                carbs += item.carbs
+                fat += item.fat
+        return {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat}
+    
+    arrays = user.food_arrays()
+    mask = arrays.dates == np.datetime64(log_date, "D")
     summary = {
-        "calories": sum(item.calories for item in daily_items),
-        "protein": sum(item.protein for item in daily_items),
-        "carbs": sum(item.carbs for item in daily_items),
-        "fat": sum(item.fat for item in daily_items),
+        "calories": int(arrays.calories[mask].sum()),
+        "protein": float(arrays.protein[mask].sum()),
+        "carbs": float(arrays.carbs[mask].sum()),
+        "fat": float(arrays.fat[mask].sum()),
     }
     return summary
 
@@ -202,7 +176,7 @@ def onboarding_page():
                 user_id = main.create_user(profile, start_weight_kg, name)
                 
                 initial_log = LogEntry(log_date=date.today(), weight_kg=start_weight_kg, calories_in=0)
-                st.session_state.db[user_id].logs.append(initial_log)
+                st.session_state.db[user_id].upsert_log(initial_log)
 
                 st.session_state.user_id = user_id
                 st.session_state.page = "dashboard"
@@ -225,16 +199,18 @@ def dashboard_page():
     st.sidebar.markdown("---")
     st.sidebar.subheader("📱 Navigation")
     
-    # Navigation buttons
-    if st.sidebar.button("🏠 Dashboard", use_container_width=True, type="primary" if st.session_state.get('current_view', 'dashboard') == 'dashboard' else "secondary"):
+    # Navigation buttons. The click itself already reruns the script, so only force
+    # another rerun when the view actually changes.
+    current_view = st.session_state.get('current_view', 'dashboard')
+    if st.sidebar.button("🏠 Dashboard", use_container_width=True, type="primary" if current_view == 'dashboard' else "secondary") and current_view != 'dashboard':
         st.session_state.current_view = "dashboard"
         st.rerun()
         
-    if st.sidebar.button("📊 Analytics", use_container_width=True, type="primary" if st.session_state.get('current_view', 'dashboard') == 'analytics' else "secondary"):
+    if st.sidebar.button("📊 Analytics", use_container_width=True, type="primary" if current_view == 'analytics' else "secondary") and current_view != 'analytics':
         st.session_state.current_view = "analytics"
         st.rerun()
 
-    if st.sidebar.button("⚡ Performance", use_container_width=True, type="primary" if st.session_state.get('current_view', 'dashboard') == 'performance' else "secondary"):
+    if st.sidebar.button("⚡ Performance", use_container_width=True, type="primary" if current_view == 'performance' else "secondary") and current_view != 'performance':
         st.session_state.current_view = "performance"
         st.rerun()
     
@@ -253,8 +229,6 @@ def dashboard_page():
         st.sidebar.info("💡 Make sure to set up your OPENROUTER_API_KEY in the .env file")
 
     # Check which view to show
-    current_view = st.session_state.get('current_view', 'dashboard')
-    
     if current_view == 'analytics':
         visualizations_page()
         return
@@ -279,7 +253,7 @@ def dashboard_page():
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Daily Summary")
-        summary = get_daily_food_summary(user.food_items, st.session_state.diary_date)
+        summary = get_daily_food_summary(user, st.session_state.diary_date)
         
         goal_calories = user.adapted_calorie_goal
         maintenance_calories = int(user.kf_tdee_estimate)
@@ -321,22 +295,16 @@ def dashboard_page():
             "#2196F3"
         )
         
-        # Display rings in columns
-        ring_col1, ring_col2, ring_col3 = st.columns(3)
-        with ring_col1:
-            st.markdown(protein_ring, unsafe_allow_html=True)
-        with ring_col2:
-            st.markdown(carbs_ring, unsafe_allow_html=True)
-        with ring_col3:
-            st.markdown(fat_ring, unsafe_allow_html=True)
+        # Display the rings side by side in a single markdown element
+        st.markdown(combine_macro_rings(protein_ring, carbs_ring, fat_ring), unsafe_allow_html=True)
 
     with col2:
         st.subheader("Log Your Weight")
         
         # Check if weight has already been logged for the selected date
-        todays_log = next((log for log in user.logs if log.log_date == st.session_state.diary_date and log.weight_kg > 0), None)
+        todays_log = user.log_for_date(st.session_state.diary_date)
 
-        if todays_log:
+        if todays_log and todays_log.weight_kg > 0:
             st.success(f"Weight logged for this day: {todays_log.weight_kg} kg")
         else:
             current_weight = user.logs[-1].weight_kg if user.logs else user.profile.goal_weight_kg - 5.0
@@ -345,17 +313,12 @@ def dashboard_page():
                 
                 submitted = st.form_submit_button("Log Weight", type="primary", use_container_width=True)
                 if submitted:
-                    summary = get_daily_food_summary(user.food_items, st.session_state.diary_date)
+                    summary = get_daily_food_summary(user, st.session_state.diary_date)
                     total_calories = summary['calories']
 
-                    log_entry = next((log for log in user.logs if log.log_date == st.session_state.diary_date), None)
-                    if log_entry:
-                        log_entry.weight_kg = weight_kg
-                        log_entry.calories_in = total_calories
-                    else:
-                        user.logs.append(LogEntry(log_date=st.session_state.diary_date, weight_kg=weight_kg, calories_in=total_calories))
+                    user.upsert_log(LogEntry(log_date=st.session_state.diary_date, weight_kg=weight_kg, calories_in=total_calories))
                     
-                    user.logs.sort(key=lambda x: x.log_date)
+                    # upsert_log inserts in date order, so no re-sort is needed
                     user.days_since_last_adaptation += 1
                     
                     updated_user = kalman_filter_model.run_full_kalman_update(user)
@@ -372,12 +335,19 @@ def dashboard_page():
 
     st.header("Food Diary")
     meal_cols = st.columns(4)
-    meal_types = ["Breakfast", "Lunch", "Dinner", "Snacks"]
+    meal_types = MEAL_TYPES
+
+    # Bucket the day's items by meal in one pass over the diary
+    diary_date = st.session_state.diary_date
+    items_by_meal = {meal: [] for meal in meal_types}
+    for item in user.food_items.values():
+        if item.log_date == diary_date and item.meal_type in items_by_meal:
+            items_by_meal[item.meal_type].append(item)
 
     for col, meal in zip(meal_cols, meal_types):
         with col:
             st.subheader(meal)
-            meal_items = [item for item in user.food_items if item.log_date == st.session_state.diary_date and item.meal_type == meal]
+            meal_items = items_by_meal[meal]
             
             if meal_items:
                 for item in meal_items:
@@ -386,10 +356,11 @@ def dashboard_page():
                         c1.markdown(f"**{item.name}**")
                         c2.markdown(f"_{item.calories} kcal_")
                         if c3.button("🗑️", key=f"del_{item.id}", help="Delete item"):
-                            user.food_items = [i for i in user.food_items if i.id != item.id]
+                            user.food_items.pop(item.id, None)
                             st.rerun()
 
-            if st.button(f"＋ Add to {meal}", key=f"add_{meal}", use_container_width=True):
+            add_label, add_key = MEAL_ADD_BUTTONS[meal]
+            if st.button(add_label, key=add_key, use_container_width=True):
                 add_food_dialog(user, meal, st.session_state.diary_date)
                 
     st.divider()
@@ -397,32 +368,33 @@ def dashboard_page():
     with tab2:
         st.subheader("Quick Progress Overview")
         if len(user.logs) >= 2:
-            df = pd.DataFrame([log.model_dump() for log in user.logs])
-            df['log_date'] = pd.to_datetime(df['log_date'])
+            # Build the columns straight from the cached log arrays instead of dumping each log
+            arrays = user.log_arrays()
+            df = pd.DataFrame({
+                'log_date': arrays.dates.astype("datetime64[ns]"),
+                'weight_kg': arrays.weights,
+            })
 
             col_chart, col_info = st.columns([2, 1])
             
             with col_chart:
                 st.markdown("**Recent Weight Trend**")
-                min_weight = df['weight_kg'].min()
-                max_weight = df['weight_kg'].max()
+                min_weight = arrays.weights.min()
+                max_weight = arrays.weights.max()
                 weight_buffer = (max_weight - min_weight) * 0.1 + 1 
-                weight_domain = [min_weight - weight_buffer, max_weight + weight_buffer]
-
-                weight_chart = alt.Chart(df).mark_line(
-                    color='#1f77b4',
-                    point=True
-                ).encode(
-                    x=alt.X('log_date:T', title='Date'),
-                    y=alt.Y('weight_kg:Q', title='Weight (kg)', scale=alt.Scale(domain=weight_domain, clamp=True)),
-                    tooltip=['log_date', 'weight_kg']
-                ).interactive()
-                st.altair_chart(weight_chart, use_container_width=True)
+                weight_domain = [float(min_weight - weight_buffer), float(max_weight + weight_buffer)]
+
+                weight_spec = copy.deepcopy(WEIGHT_TREND_SPEC)
+                weight_spec["encoding"]["y"]["scale"]["domain"] = weight_domain
+                if len(df) < WEIGHT_TREND_ZOOM_MIN_POINTS:
+                    # Nothing to zoom into; skip the selection's extra dataflow
+                    del weight_spec["params"]
+                st.vega_lite_chart(df, weight_spec, use_container_width=True)
             
             with col_info:
                 st.markdown("**📊 Quick Stats**")
-                latest_weight = df['weight_kg'].iloc[-1]
-                initial_weight = df['weight_kg'].iloc[0]
+                latest_weight = arrays.weights[-1]
+                initial_weight = arrays.weights[0]
                 total_change = latest_weight - initial_weight
                 days_tracked = len(df)
                 
@@ -506,40 +478,6 @@ def run_app():
     # This handles cases where the module might be reloaded but session state persists
     main.db = st.session_state.db
     
-    # We also need to slightly adjust how the backend db is patched
-    # to make sure the name change is compatible.
-    if "main_initialized" not in st.session_state:
-        # We need to monkey-patch the create_user function in main
-        original_create_user = main.create_user
-        def patched_create_user(profile: UserProfile, start_weight_kg: float, name: str):
-            import uuid
-            user_id = str(uuid.uuid4())
-            initial_tdee = tdee_logic.calculate_initial_tdee(profile, start_weight_kg)
-            daily_adj = (profile.goal_kg_per_week * kalman_filter_model.CALORIES_PER_KG) / 7
-            initial_goal = int(initial_tdee + daily_adj)
-            
-            # Calculate initial macro targets
-            initial_macro_targets = tdee_logic.calculate_macro_targets(
-                initial_goal, profile, start_weight_kg
-            )
-
-            new_user = User(
-                user_id=user_id,
-                name=name,
-                profile=profile,
-                initial_calorie_goal=initial_goal,
-                adapted_calorie_goal=initial_goal,
-                macro_targets=initial_macro_targets,
-                kf_tdee_estimate=initial_tdee,
-            )
-            # Use the global main.db which we ensured points to st.session_state.db
-            main.db[user_id] = new_user
-            return user_id
-
-        main.create_user = patched_create_user
-        st.session_state.main_initialized = True
-
-
     if st.session_state.page == "login": login_page()
     elif st.session_state.page == "onboarding": onboarding_page()
     elif st.session_state.page == "dashboard" and st.session_state.user_id: dashboard_page()
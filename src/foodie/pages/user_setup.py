@@ -0,0 +1,35 @@
+import uuid
+from foodie.logic.models import UserProfile, User
+import foodie.logic.tdee_logic as tdee_logic
+import foodie.logic.kalman_filter_model as kalman_filter_model
+import foodie.logic.adaptive_service as main
+
+# The backend's create_user doesn't take a display name; swap in a version that does.
+# This lives outside streamlit_app.py, which Streamlit re-executes on every rerun,
+# so the patch below runs once per process. It writes to main.db, which run_app
+# points at the session's db on every run.
+def patched_create_user(profile: UserProfile, start_weight_kg: float, name: str):
+    user_id = str(uuid.uuid4())
+    initial_tdee = tdee_logic.calculate_initial_tdee(profile, start_weight_kg)
+    daily_adj = (profile.goal_kg_per_week * kalman_filter_model.CALORIES_PER_KG) / 7
+    initial_goal = int(initial_tdee + daily_adj)
+    
+    # Calculate initial macro targets
+    initial_macro_targets = tdee_logic.calculate_macro_targets(
+        initial_goal, profile, start_weight_kg
+    )
+
+    new_user = User(
+        user_id=user_id,
+        name=name,
+        profile=profile,
+        initial_calorie_goal=initial_goal,
+        adapted_calorie_goal=initial_goal,
+        macro_targets=initial_macro_targets,
+        kf_tdee_estimate=initial_tdee,
+    )
+    # Use the global main.db which we ensured points to st.session_state.db
+    main.db[user_id] = new_user
+    return user_id
+
+main.create_user = patched_create_user
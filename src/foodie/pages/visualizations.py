@@ -1,9 +1,86 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import altair as alt
 from datetime import date
-from typing import List
-from foodie.logic.models import User, LogEntry
+from typing import List, Optional
+from foodie.logic.models import User, LogEntry, LogArrays, FoodArrays
+
+# A day within this many kcal of the TDEE counts as balanced
+BALANCED_BAND_KCAL = 100
+
+# Reruns from tab switches and widget changes reuse these frames; each is keyed on
+# the state it is derived from and takes the raw data as an unhashed `_` argument.
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _build_log_df(user_id: str, logs_key: tuple, tdee: int, _arrays) -> pd.DataFrame:
+    """Per-day log frame with the net calorie balance against the current TDEE"""
+    # Columns come straight from the User's cached log arrays; no per-log model_dump
+    df = pd.DataFrame({
+        "log_date": _arrays.dates.astype("datetime64[ns]"),
+        "weight_kg": _arrays.weights,
+        "calories_in": _arrays.calories,
+    })
+    
+    # Whole kcal are all the page shows, so keep the net as int32 rather than float64
+    df["net_calories"] = (_arrays.calories - tdee).astype(np.int32)
+    return df
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _build_weekly(user_id: str, logs_key: tuple, tdee: int, _arrays: LogArrays) -> pd.DataFrame:
+    """Per-week weight change, average intake and average net balance"""
+    # Logs are date-sorted, so each Monday-to-Sunday week is a contiguous run.
+    # Day 0 of datetime64 is a Thursday; shifting by 3 makes weeks start on Monday.
+    week = (_arrays.dates.astype(np.int64) + 3) // 7
+    week_ids, starts = np.unique(week, return_index=True)
+    ends = np.r_[starts[1:], len(week)]
+    
+    avg_intake = np.add.reduceat(_arrays.calories, starts) / (ends - starts)
+    week_start = (week_ids * 7 - 3).astype("datetime64[D]")
+    weekly = pd.DataFrame({
+        # Same "start/end" labels as pandas' weekly periods
+        "week": np.char.add(np.char.add(np.datetime_as_string(week_start), "/"),
+                            np.datetime_as_string(week_start + 6)),
+        "weight_start": _arrays.weights[starts],
+        "weight_end": _arrays.weights[ends - 1],
+        "avg_intake": avg_intake,
+        "avg_net": avg_intake - tdee,
+    })
+    
+    weekly["change"] = weekly["weight_end"] - weekly["weight_start"]
+    return weekly
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _build_daily_macros(user_id: str, food_key: tuple, today: date, targets: tuple,
+                        _arrays: FoodArrays) -> Optional[pd.DataFrame]:
+    """Daily macro totals over the last 30 days next to the targets, or None without recent food"""
+    # Filter for recent days (last 30 days for macro analysis) with one array mask
+    cutoff = np.datetime64(today, "D") - np.timedelta64(30, "D")
+    mask = _arrays.dates >= cutoff
+    if not mask.any():
+        return None
+    
+    macro_df = pd.DataFrame({
+        'date': _arrays.dates[mask].astype("datetime64[ns]"),
+        'protein': _arrays.protein[mask],
+        'carbs': _arrays.carbs[mask],
+        'fat': _arrays.fat[mask]
+    })
+    
+    # Aggregate by day
+    daily_macros = macro_df.groupby('date').agg({
+        'protein': 'sum',
+        'carbs': 'sum', 
+        'fat': 'sum'
+    }).reset_index()
+    
+    # Add targets for comparison
+    daily_macros['protein_target'], daily_macros['carbs_target'], daily_macros['fat_target'] = targets
+    return daily_macros
+
+def _metric_table(rows: List[tuple]):
+    """Render (label, value) pairs as one table instead of a stack of st.metric elements"""
+    st.table(pd.DataFrame(rows, columns=["Metric", "Value"]).set_index("Metric"))
 
 def visualizations_page():
     """Comprehensive visualizations and analytics page."""
@@ -29,13 +106,16 @@ def visualizations_page():
         """)
         return
 
+    # Values read by several sections below, looked up once
+    profile = user.profile
+    goal_rate = profile.goal_kg_per_week
+    # Whole kcal, so every chart, KPI and day count below compares against the same TDEE
+    tdee = round(user.kf_tdee_estimate)
+
     # Prepare data for visualizations
-    df = pd.DataFrame([log.model_dump() for log in user.logs])
-    df["log_date"] = pd.to_datetime(df["log_date"])
-    df = df.sort_values("log_date")
-    
-    df["calories_out"] = user.kf_tdee_estimate
-    df["net_calories"] = df["calories_in"] - df["calories_out"]
+    arrays = user.log_arrays()
+    logs_key = user._logs_key()
+    df = _build_log_df(user.user_id, logs_key, tdee, arrays)
 
     # === KPI DASHBOARD ===
     st.header("🎯 Key Performance Indicators")
@@ -43,15 +123,17 @@ def visualizations_page():
     
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
     
-    latest_weight = df.weight_kg.iloc[-1]
-    avg_intake = df.calories_in.mean()
-    est_burn = df.calories_out.mean()
+    # Headline numbers straight off the sorted arrays
+    latest_weight = arrays.weights[-1]
+    avg_intake = arrays.calories.mean()
+    est_burn = tdee
     net_calories = df.net_calories.mean()
     
-    # Calculate trends for delta indicators
-    if len(df) >= 7:
-        recent_weight_trend = df.weight_kg.iloc[-7:].mean() - df.weight_kg.iloc[-14:-7].mean() if len(df) >= 14 else 0
-        recent_intake_trend = df.calories_in.iloc[-7:].mean() - df.calories_in.iloc[-14:-7].mean() if len(df) >= 14 else 0
+    # Calculate trends for delta indicators: last 7 logs against the 7 before them
+    weights, calories = arrays.weights, arrays.calories
+    if weights.size >= 14:
+        recent_weight_trend = weights[-7:].mean() - weights[-14:-7].mean()
+        recent_intake_trend = calories[-7:].mean() - calories[-14:-7].mean()
     else:
         recent_weight_trend = 0
         recent_intake_trend = 0
@@ -95,12 +177,14 @@ def visualizations_page():
         st.markdown("**Your weight journey over time**")
         
         # Enhanced weight chart with trend line
-        min_weight = df['weight_kg'].min()
-        max_weight = df['weight_kg'].max()
+        min_weight = arrays.weights.min()
+        max_weight = arrays.weights.max()
         weight_buffer = max((max_weight - min_weight) * 0.1, 1)
         weight_domain = [min_weight - weight_buffer, max_weight + weight_buffer]
 
-        base_chart = alt.Chart(df).add_selection(
+        # Each chart gets only the columns it encodes, so less data is serialized to the spec.
+        # Only the weight chart pans and zooms; the other charts are static.
+        base_chart = alt.Chart(df[['log_date', 'weight_kg']]).add_selection(
             alt.selection_interval(bind='scales')
         )
         
@@ -116,12 +200,17 @@ def visualizations_page():
         
         # Add trend line if enough data points
         if len(df) >= 5:
-            trend_line = base_chart.mark_line(
+            # Least-squares fit here; the chart only needs the line's two endpoints
+            days = (arrays.dates - arrays.dates[0]).astype(np.int64)
+            slope, intercept = np.polyfit(days, arrays.weights, 1)
+            trend_df = pd.DataFrame({
+                'log_date': arrays.dates[[0, -1]].astype("datetime64[ns]"),
+                'weight_kg': [intercept, slope * days[-1] + intercept]
+            })
+            trend_line = alt.Chart(trend_df).mark_line(
                 color='red',
                 strokeDash=[5, 5],
                 strokeWidth=2
-            ).transform_regression(
-                'log_date', 'weight_kg'
             ).encode(
                 x='log_date:T',
                 y='weight_kg:Q'
@@ -136,21 +225,23 @@ def visualizations_page():
         st.markdown("**Key Insights**")
         
         # Calculate weight change statistics
-        total_change = latest_weight - df.weight_kg.iloc[0]
+        total_change = latest_weight - arrays.weights[0]
         days_tracked = len(df)
         avg_weekly_change = (total_change / days_tracked) * 7 if days_tracked > 0 else 0
         
-        goal_weight = user.profile.goal_weight_kg
+        goal_weight = profile.goal_weight_kg
         weight_to_goal = latest_weight - goal_weight
         
-        st.metric("📊 Total Change", f"{total_change:+.1f} kg")
-        st.metric("📅 Days Tracked", f"{days_tracked}")
-        st.metric("⏱️ Avg Weekly Rate", f"{avg_weekly_change:+.1f} kg/week")
-        st.metric("🎯 To Goal", f"{weight_to_goal:+.1f} kg")
+        _metric_table([
+            ("📊 Total Change", f"{total_change:+.1f} kg"),
+            ("📅 Days Tracked", f"{days_tracked}"),
+            ("⏱️ Avg Weekly Rate", f"{avg_weekly_change:+.1f} kg/week"),
+            ("🎯 To Goal", f"{weight_to_goal:+.1f} kg"),
+        ])
         
         if abs(weight_to_goal) < 0.5:
             st.success("🎉 Very close to goal!")
-        elif weight_to_goal * user.profile.goal_kg_per_week < 0:
+        elif weight_to_goal * goal_rate < 0:
             st.info("📈 On track to goal!")
 
     st.divider()
@@ -163,57 +254,64 @@ def visualizations_page():
     with tab1:
         st.markdown("**Daily calorie intake vs estimated expenditure**")
         
-        # Intake vs Burn Chart
-        intake_burn_chart = alt.Chart(df).transform_fold(
-            ["calories_in", "calories_out"],
-            as_=["Type", "Calories"]
+        # Intake vs Burn Chart: daily intake against the TDEE as one flat rule,
+        # both colored through the same legend
+        type_scale = alt.Scale(
+            domain=['calories_in', 'calories_out'],
+            range=['#ff6b6b', '#4ecdc4']
+        )
+        type_legend = alt.Legend(
+            symbolType='circle',
+            symbolSize=100,
+            labelFontSize=12
+        )
+        intake_line = alt.Chart(df[['log_date', 'calories_in']]).transform_calculate(
+            Type="'calories_in'"
         ).mark_line(
             point=True,
             strokeWidth=3
         ).encode(
             x=alt.X('log_date:T', title='Date'),
-            y=alt.Y('Calories:Q', title='Calories'),
-            color=alt.Color(
-                'Type:N', 
-                title='Type',
-                scale=alt.Scale(
-                    domain=['calories_in', 'calories_out'],
-                    range=['#ff6b6b', '#4ecdc4']
-                ),
-                legend=alt.Legend(
-                    symbolType='circle',
-                    symbolSize=100,
-                    labelFontSize=12
-                )
-            ),
-            tooltip=['log_date:T', 'Type:N', 'Calories:Q']
-        ).interactive()
+            y=alt.Y('calories_in:Q', title='Calories'),
+            color=alt.Color('Type:N', title='Type', scale=type_scale, legend=type_legend),
+            tooltip=['log_date:T', 'Type:N', 'calories_in:Q']
+        )
+        burn_rule = alt.Chart(pd.DataFrame({'Type': ['calories_out'], 'calories_out': [tdee]})).mark_rule(
+            strokeWidth=3
+        ).encode(
+            y='calories_out:Q',
+            color=alt.Color('Type:N', title='Type', scale=type_scale, legend=type_legend),
+            tooltip=['Type:N', 'calories_out:Q']
+        )
+        intake_burn_chart = intake_line + burn_rule
         
         st.altair_chart(intake_burn_chart, use_container_width=True)
         
-        # Balance insights
-        avg_deficit = df[df['net_calories'] < 0]['net_calories'].mean()
-        avg_surplus = df[df['net_calories'] > 0]['net_calories'].mean()
+        # Balance insights from the same daily net calories the net chart plots
+        net = df.net_calories.to_numpy()
+        deficit, surplus = net < 0, net > 0
+        deficit_days = np.count_nonzero(deficit)
+        surplus_days = np.count_nonzero(surplus)
+        balanced_days = np.count_nonzero(np.abs(net) < BALANCED_BAND_KCAL)
+        avg_deficit = net[deficit].mean() if deficit_days else np.nan
+        avg_surplus = net[surplus].mean() if surplus_days else np.nan
         
         insight_col1, insight_col2, insight_col3 = st.columns(3)
         
         with insight_col1:
-            deficit_days = len(df[df['net_calories'] < 0])
             st.metric("📉 Deficit Days", f"{deficit_days}/{len(df)}")
             
         with insight_col2:
-            surplus_days = len(df[df['net_calories'] > 0])  
             st.metric("📈 Surplus Days", f"{surplus_days}/{len(df)}")
             
         with insight_col3:
-            balanced_days = len(df[abs(df['net_calories']) < 100])
             st.metric("⚖️ Balanced Days", f"{balanced_days}/{len(df)}")
 
     with tab2:
         st.markdown("**Daily calorie surplus/deficit patterns**")
         
         # Net Calories Bar Chart  
-        net_chart = alt.Chart(df).mark_bar().encode(
+        net_chart = alt.Chart(df[['log_date', 'net_calories', 'calories_in']]).mark_bar().encode(
             x=alt.X('log_date:T', title='Date'),
             y=alt.Y('net_calories:Q', title='Net Calories (Intake - Burn)'),
             color=alt.condition(
@@ -221,8 +319,8 @@ def visualizations_page():
                 alt.value('#ff6b6b'),  # Red for surplus
                 alt.value('#4ecdc4')   # Green for deficit  
             ),
-            tooltip=['log_date:T', 'net_calories:Q', 'calories_in:Q', 'calories_out:Q']
-        ).interactive()
+            tooltip=['log_date:T', 'net_calories:Q', 'calories_in:Q']
+        )
         
         # Add zero line
         zero_line = alt.Chart(pd.DataFrame({'y': [0]})).mark_rule(
@@ -247,34 +345,14 @@ def visualizations_page():
     if len(user.food_items) == 0:
         st.info("🥗 Start logging food to see your macro nutrient patterns!")
     else:
-        # Prepare macro data
-        macro_data = []
-        for item in user.food_items:
-            # Filter for recent days (last 30 days for macro analysis)
-            if (date.today() - item.log_date).days <= 30:
-                macro_data.append({
-                    'date': item.log_date,
-                    'protein': item.protein,
-                    'carbs': item.carbs,
-                    'fat': item.fat
-                })
+        daily_macros = None
+        if user.has_recent_food(30):
+            targets = (user.macro_targets.protein_g, user.macro_targets.carbs_g, user.macro_targets.fat_g)
+            daily_macros = _build_daily_macros(
+                user.user_id, user._food_key(), date.today(), targets, user.food_arrays()
+            )
         
-        if macro_data:
-            macro_df = pd.DataFrame(macro_data)
-            macro_df['date'] = pd.to_datetime(macro_df['date'])
-            
-            # Aggregate by day
-            daily_macros = macro_df.groupby('date').agg({
-                'protein': 'sum',
-                'carbs': 'sum', 
-                'fat': 'sum'
-            }).reset_index()
-            
-            # Add targets for comparison
-            daily_macros['protein_target'] = user.macro_targets.protein_g
-            daily_macros['carbs_target'] = user.macro_targets.carbs_g
-            daily_macros['fat_target'] = user.macro_targets.fat_g
-            
+        if daily_macros is not None:
             macro_col1, macro_col2 = st.columns([2, 1])
             
             with macro_col1:
@@ -288,22 +366,17 @@ def visualizations_page():
                     value_name='grams'
                 )
                 
-                # Separate actual vs target data
-                macro_chart_data['category'] = macro_chart_data['macro_type'].apply(
-                    lambda x: 'Target' if 'target' in x else 'Actual'
-                )
-                macro_chart_data['macro'] = macro_chart_data['macro_type'].apply(
-                    lambda x: x.replace('_target', '').title()
-                )
-                
-                base_chart = alt.Chart(macro_chart_data).add_selection(
-                    alt.selection_interval(bind='scales')
-                )
+                # Separate actual vs target data here, so each layer carries only its
+                # own rows instead of filtering the full set in the spec
+                macro_type = macro_chart_data['macro_type']
+                is_target = macro_type.str.endswith('_target')
+                macro_chart_data['macro'] = macro_type.str.replace('_target', '', regex=False).str.title()
+                macro_columns = ['date', 'macro', 'grams']
+                actual_data = macro_chart_data.loc[~is_target, macro_columns]
+                target_data = macro_chart_data.loc[is_target, macro_columns]
                 
                 # Actual values as bars
-                actual_bars = base_chart.transform_filter(
-                    alt.datum.category == 'Actual'
-                ).mark_bar(opacity=0.7).encode(
+                actual_bars = alt.Chart(actual_data).mark_bar(opacity=0.7).encode(
                     x=alt.X('date:T', title='Date'),
                     y=alt.Y('grams:Q', title='Grams'),
                     color=alt.Color('macro:N', 
@@ -316,9 +389,7 @@ def visualizations_page():
                 )
                 
                 # Target lines
-                target_lines = base_chart.transform_filter(
-                    alt.datum.category == 'Target'
-                ).mark_line(strokeDash=[5, 5], strokeWidth=2).encode(
+                target_lines = alt.Chart(target_data).mark_line(strokeDash=[5, 5], strokeWidth=2).encode(
                     x='date:T',
                     y='grams:Q',
                     color=alt.Color('macro:N', 
@@ -343,9 +414,11 @@ def visualizations_page():
                 carbs_achievement = (recent_days['carbs'] / recent_days['carbs_target']).mean()
                 fat_achievement = (recent_days['fat'] / recent_days['fat_target']).mean()
                 
-                st.metric("🥩 Protein Achievement", f"{protein_achievement:.1%}")
-                st.metric("🍞 Carbs Achievement", f"{carbs_achievement:.1%}")  
-                st.metric("🥑 Fat Achievement", f"{fat_achievement:.1%}")
+                _metric_table([
+                    ("🥩 Protein Achievement", f"{protein_achievement:.1%}"),
+                    ("🍞 Carbs Achievement", f"{carbs_achievement:.1%}"),
+                    ("🥑 Fat Achievement", f"{fat_achievement:.1%}"),
+                ])
                 
                 # Overall macro balance
                 overall_score = (protein_achievement + carbs_achievement + fat_achievement) / 3
@@ -367,21 +440,12 @@ def visualizations_page():
         st.markdown("**Weekly weight change patterns**")
         
         # Weekly Weight Change
-        df_copy = df.copy()
-        df_copy["week"] = df_copy["log_date"].dt.to_period("W").astype(str)
-        weekly = df_copy.groupby("week").agg(
-            weight_start=("weight_kg", "first"),
-            weight_end=("weight_kg", "last"),
-            avg_intake=("calories_in", "mean"),
-            avg_net=("net_calories", "mean")
-        ).reset_index()
-        
-        weekly["change"] = weekly["weight_end"] - weekly["weight_start"]
+        weekly = _build_weekly(user.user_id, logs_key, tdee, arrays)
         
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            weekly_chart = alt.Chart(weekly).mark_bar().encode(
+            weekly_chart = alt.Chart(weekly[['week', 'change', 'avg_intake', 'avg_net']]).mark_bar().encode(
                 x=alt.X('week:N', title='Week'),
                 y=alt.Y('change:Q', title='Weight Change (kg)'),
                 color=alt.condition(
@@ -390,24 +454,25 @@ def visualizations_page():
                     alt.value('#ff6b6b')   # Red for weight gain
                 ),
                 tooltip=['week:N', 'change:Q', 'avg_intake:Q', 'avg_net:Q']
-            ).interactive()
+            )
             
             st.altair_chart(weekly_chart, use_container_width=True)
         
         with col2:
             st.markdown("**Weekly Insights**")
             avg_weekly_change = weekly["change"].mean()
-            best_week = weekly.loc[weekly["change"].idxmin()] if user.profile.goal_kg_per_week < 0 else weekly.loc[weekly["change"].idxmax()]
+            best_week = weekly.loc[weekly["change"].idxmin()] if goal_rate < 0 else weekly.loc[weekly["change"].idxmax()]
             
-            st.metric("📊 Avg Weekly Change", f"{avg_weekly_change:+.2f} kg")
-            st.metric("🏆 Best Week", f"{best_week['change']:+.2f} kg")
-            st.metric("📝 Best Week Intake", f"{best_week['avg_intake']:.0f} kcal")
+            _metric_table([
+                ("📊 Avg Weekly Change", f"{avg_weekly_change:+.2f} kg"),
+                ("🏆 Best Week", f"{best_week['change']:+.2f} kg"),
+                ("📝 Best Week Intake", f"{best_week['avg_intake']:.0f} kcal"),
+            ])
             
             # Goal comparison
-            goal_weekly = user.profile.goal_kg_per_week
-            if abs(avg_weekly_change - goal_weekly) <= 0.1:
+            if abs(avg_weekly_change - goal_rate) <= 0.1:
                 st.success("🎯 On target!")
-            elif (goal_weekly < 0 and avg_weekly_change > goal_weekly) or (goal_weekly > 0 and avg_weekly_change < goal_weekly):
+            elif (goal_rate < 0 and avg_weekly_change > goal_rate) or (goal_rate > 0 and avg_weekly_change < goal_rate):
                 st.warning("📈 Adjust intake")
             else:
                 st.info("📊 Good progress")
@@ -423,7 +488,6 @@ def visualizations_page():
     
     with success_col1:
         st.markdown("**🎯 Goal Alignment**")
-        goal_rate = user.profile.goal_kg_per_week
         actual_rate = avg_weekly_change if len(df) >= 7 else 0
         alignment_score = max(0, 100 - abs(actual_rate - goal_rate) * 100) if len(df) >= 7 else 0
         
@@ -1,12 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date, timedelta
 import math
-from typing import List
 import altair as alt
 
 # Backend imports
-from foodie.logic.models import UserProfile, LogEntry, User, FoodItem
+from foodie.logic.models import UserProfile, LogEntry, User
 import foodie.logic.tdee_logic as tdee_logic
 import foodie.logic.kalman_filter_model as kalman_filter_model
 import foodie.logic.adaptive_service as main
@@ -33,13 +33,14 @@ def calculate_time_to_goal(user: User):
     return f"{estimated_weeks:.1f} weeks", f"~{estimated_days} days remaining"
 
 
-def get_daily_food_summary(food_items: List[FoodItem], log_date: date):
-    daily_items = [i for i in food_items if i.log_date == log_date]
+def get_daily_food_summary(user: User, log_date: date):
+    arrays = user.food_arrays()
+    mask = arrays.dates == np.datetime64(log_date, "D")
     return {
-        "calories": sum(i.calories for i in daily_items),
-        "protein": sum(i.protein for i in daily_items),
-        "carbs": sum(i.carbs for i in daily_items),
-        "fat": sum(i.fat for i in daily_items),
+        "calories": int(arrays.calories[mask].sum()),
+        "protein": float(arrays.protein[mask].sum()),
+        "carbs": float(arrays.carbs[mask].sum()),
+        "fat": float(arrays.fat[mask].sum()),
     }
 
 # -----------------------------
@@ -72,7 +73,7 @@ def dashboard_page():
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Daily Summary")
-        summary = get_daily_food_summary(user.food_items, st.session_state.diary_date)
+        summary = get_daily_food_summary(user, st.session_state.diary_date)
 
         goal = user.adapted_calorie_goal
         maintenance = int(user.kf_tdee_estimate)
@@ -86,7 +87,7 @@ def dashboard_page():
 
     with col2:
         st.subheader("Log Weight")
-        today_log = next((l for l in user.logs if l.log_date == st.session_state.diary_date), None)
+        today_log = user.log_for_date(st.session_state.diary_date)
 
         if today_log:
             st.success(f"Logged: {today_log.weight_kg} kg")
@@ -94,12 +95,11 @@ def dashboard_page():
             with st.form("weight_form"):
                 w = st.number_input("Weight (kg)", value=user.logs[-1].weight_kg if user.logs else 70.0, step=0.1)
                 if st.form_submit_button("Log"):
-                    user.logs.append(LogEntry(
+                    user.upsert_log(LogEntry(
                         log_date=st.session_state.diary_date,
                         weight_kg=w,
                         calories_in=summary["calories"]
                     ))
-                    user.logs.sort(key=lambda x: x.log_date)
                     kalman_filter_model.run_full_kalman_update(user)
                     main.adapt_user_goals(user.user_id)
                     st.rerun()
@@ -116,7 +116,7 @@ def dashboard_page():
     for col, meal in zip(cols, meals):
         with col:
             st.subheader(meal)
-            items = [i for i in user.food_items if i.log_date == st.session_state.diary_date and i.meal_type == meal]
+            items = [i for i in user.food_items.values() if i.log_date == st.session_state.diary_date and i.meal_type == meal]
             for item in items:
                 st.write(f"• {item.name} ({item.calories} kcal)")
             if st.button(f"+ Add {meal}", key=meal):